@@ -0,0 +1,716 @@
+#!/usr/bin/env python3
+"""
+Stress Tests and Benchmarks
+
+Standalone checks for the storage and extraction code that run without
+Slack access. Each subcommand prints its measurements and exits non-zero
+if a correctness check fails.
+
+    python benchmarks.py storage --processes 1 2 4 8 --per-process 200
+    python benchmarks.py requester --messages 2000 20000 100000
+    python benchmarks.py classifier --messages 20000 [--corpus messages.json]
+    python benchmarks.py parse --messages 200000 --workers 1 2 4 8
+    python benchmarks.py search --requests 200000
+    python benchmarks.py duplicates --requests 200000 --window-days 30
+    python benchmarks.py report --requests 200000
+    python benchmarks.py archive --requests 100000
+    python benchmarks.py metrics --observations 200000 --threads 4
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import json
+import tempfile
+import multiprocessing
+
+import request_store
+from request_db import RequestDB, DB_FILE_NAME, export_month
+
+STRESS_MONTH = "2000-01"
+
+
+def _storage_writer(folder, worker_id, count):
+    """Add count uniquely tagged requests to the stress month, one transaction each."""
+    db = RequestDB(os.path.join(folder, DB_FILE_NAME))
+    for seq in range(count):
+        db.add_request({
+            "item_name": f"stress item {worker_id}-{seq}",
+            "quantity": "1",
+            "catalog_number": f"W{worker_id}-{seq}",
+            "link": "https://example.com",
+            "date_of_request": STRESS_MONTH,
+            "worker": worker_id,
+            "seq": seq,
+        }, user_id=f"W{worker_id}", month=STRESS_MONTH)
+
+
+def _storage_exporter(folder, stop_event):
+    """Re-export the month's JSON/CSV in a loop while writers are adding requests."""
+    db = RequestDB(os.path.join(folder, DB_FILE_NAME))
+    while not stop_event.is_set():
+        export_month(db, STRESS_MONTH, folder, folder)
+
+
+def run_storage_stress(processes, per_process):
+    """Run parallel writer processes against one month and verify nothing was lost."""
+    folder = tempfile.mkdtemp(prefix="request_db_stress_")
+    try:
+        db = RequestDB(os.path.join(folder, DB_FILE_NAME))
+        stop_event = multiprocessing.Event()
+        exporter = multiprocessing.Process(target=_storage_exporter, args=(folder, stop_event))
+        writers = [
+            multiprocessing.Process(target=_storage_writer, args=(folder, worker_id, per_process))
+            for worker_id in range(processes)
+        ]
+
+        start = time.perf_counter()
+        exporter.start()
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        elapsed = time.perf_counter() - start
+        stop_event.set()
+        exporter.join()
+
+        records = db.month_records(STRESS_MONTH)
+        seen = {(r["worker"], r["seq"]) for r in records}
+        expected = {(w, s) for w in range(processes) for s in range(per_process)}
+
+        # The exports must also be complete, parseable JSON after a final export
+        export_month(db, STRESS_MONTH, folder, folder)
+        view_count = len(request_store.load_month(folder, STRESS_MONTH))
+
+        ok = seen == expected and len(records) == len(expected) and view_count == len(expected)
+        rate = len(expected) / elapsed if elapsed else 0.0
+        status = "✅" if ok else "❌"
+        print(f"   {status} {processes:>3} processes: {len(records)}/{len(expected)} requests "
+              f"in {elapsed:.2f}s ({rate:,.0f} inserts/s)")
+        if not ok:
+            print(f"      missing: {len(expected - seen)}, duplicates: {len(records) - len(seen)}")
+        return ok
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+SYNTHETIC_ITEMS = [
+    "Antibody XYZ", "PBS buffer 10x", "Pipette tips 200ul", "Falcon tubes 50ml", "Ethanol 70%",
+    "DMEM medium", "Trypsin EDTA", "Nitrile gloves M", "Petri dishes", "Agarose powder",
+]
+SYNTHETIC_CHATTER = ["thanks!", "arrived today", "lunch?", "who has the key", "item is in the fridge"]
+
+
+def make_synthetic_channel(message_count, seed=1, start_ts=1704067200.0, max_gap=30.0):
+    """Build a chronologically sorted synthetic channel in the formats the extractor knows.
+
+    Slash commands are usually followed within seconds by the bot's
+    "New Purchase Request" message; the rest is older bot formats, free-text
+    requests and chatter. Messages are up to max_gap seconds apart, so a
+    small max_gap packs many messages into each matching window.
+    """
+    rnd = random.Random(seed)
+    users = [f"U{i:04d}" for i in range(12)]
+    messages = []
+    ts = start_ts
+    while len(messages) < message_count:
+        ts += rnd.uniform(max_gap / 30, max_gap)
+        user = rnd.choice(users)
+        item = f"{rnd.choice(SYNTHETIC_ITEMS)} {rnd.randint(1, 500)}"
+        roll = rnd.random()
+        if roll < 0.3:
+            text = (f"/purchase_request {item}, {rnd.randint(1, 9)}, CAT-{rnd.randint(100, 999)}, "
+                    f"<https://example.com/{len(messages)}>, 2024-01-{rnd.randint(10, 28)}")
+            messages.append({"ts": f"{ts:.6f}", "user": user, "text": text})
+            if rnd.random() < 0.8:
+                ts += rnd.uniform(max_gap / 60, max_gap / 6)
+                text = (f"*New Purchase Request by {user}:*\n• *Item:* {item}\n• *Quantity:* 2\n"
+                        f"• *Catalog #:* CAT-1\n• *Link:* https://example.com\n• *Date:* 2024-01-01")
+                messages.append({"ts": f"{ts:.6f}", "user": "UBOT", "text": text})
+        elif roll < 0.4:
+            text = f"Purchase request added: *{item}* (Quantity: 3, Catalog #: AB-{len(messages)})"
+            messages.append({"ts": f"{ts:.6f}", "user": "UBOT", "text": text})
+        elif roll < 0.5:
+            text = f'Could someone order "{item}" qty 4 units, catalog: ZX-{len(messages)} on 2024-03-04 https://shop.example/x'
+            messages.append({"ts": f"{ts:.6f}", "user": user, "text": text})
+        else:
+            messages.append({"ts": f"{ts:.6f}", "user": user, "text": rnd.choice(SYNTHETIC_CHATTER)})
+    return messages[:message_count]
+
+
+def compare_requester_lookups(extractor, messages):
+    """Time linear and indexed attribution of every non-slash request; return (ok, line)."""
+    from requester_index import SlashCommandIndex
+
+    lookups = []
+    for i, message in enumerate(messages):
+        request_data = extractor.parse_purchase_request(message.get("text", ""))
+        if request_data and request_data.get("format_type") != "slash_command":
+            lookups.append((i, request_data))
+
+    start = time.perf_counter()
+    linear = [extractor.find_original_requester(messages, i, data) for i, data in lookups]
+    linear_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = SlashCommandIndex(messages, extractor.parse_slash_command_format)
+    build_time = time.perf_counter() - start
+    indexed = [index.find(messages, i, data) for i, data in lookups]
+    indexed_time = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(linear, indexed) if a != b)
+    speedup = linear_time / indexed_time if indexed_time else 0.0
+    line = (f"{len(lookups):>6} lookups: linear {linear_time * 1000:8.1f} ms, "
+            f"indexed {indexed_time * 1000:8.1f} ms (build {build_time * 1000:.1f} ms), {speedup:5.1f}x")
+    if mismatches:
+        line += f"\n      {mismatches} lookups disagree"
+    return not mismatches, line
+
+
+# Hand-picked messages for the classifier golden corpus: every format, the
+# fall-through cases between them and text that only looks like a request
+GOLDEN_MESSAGES = [
+    "",
+    "lunch?",
+    "/purchase_request Antibody XYZ, 2, AB-123, <https://example.com/ab>, 2024-05-01",
+    "/PURCHASE_REQUEST *Gloves*, '3', \"CAT-9\", https://shop.example/g, tomorrow",
+    "/purchase_request Trypsin, 1, T-1",
+    "/purchase_request only two, parts",
+    "/purchase_request",
+    "/purchase_request Ethanol, 5, E-70\n• *Item:* something else",
+    "/purchase_request Tips, 2 boxes, catalog: TP-200, <not a link>, 2024-02-30",
+    "*New Purchase Request by Dana:*\n• *Item:* PBS 10x\n• *Quantity:* 2\n"
+    "• *Catalog #:* P-10\n• *Link:* https://example.com/pbs\n• *Date:* 2024-03-01",
+    "*New Purchase Request by Dana:*\n• *Item:* PBS 10x\n• *Quantity:* 2\n• *Catalog #:* P-10",
+    "*New Purchase Request by :*\n• *Item:* x\n• *Quantity:* y\n• *Catalog #:* z\n• *Link:* l\n• *Date:* d",
+    "Purchase request added: *Falcon tubes 50ml* (Quantity: 4, Catalog #: FT-50)",
+    "Purchase request added: \"Petri dishes\" (Quantity: '10', Catalog: PD-1)",
+    "purchase request added: agarose (catalog #: AG-1)",
+    "Nitrile gloves M (Quantity: 6, Catalog number: NG-M)",
+    "Product name: DMEM medium (Quantity: 3)",
+    "Product name: DMEM medium, quantity 3",
+    "Could someone order \"Ethanol 70%\" qty 4 units, catalog: ZX-1 on 2024-03-04 https://shop.example/x",
+    "I requested 'pipette tips' last week, part: PT-200, 12 pcs, 3/4/24",
+    "the *item* arrived (finally)",
+    "*Agarose powder* (sent to Ana)",
+    "item is in the fridge",
+    "Catalog says 'see page 12' #REF-9 on the shelf",
+    "quantity: 3.5 of \"buffer\" please, cat: B-1, due 2024-1-5",
+    "Added: 'abc' and 'longer name' to the list",
+    "*date* *link* *Quantity* *real item*",
+    "Requested: ((nested (parentheses)) with \"quotes\")",
+    "Ünïcödé ítem \"Çatalog thing\" Quantity: 2, Catalog: ÜX-1",
+    "Purchase request added: *" + "a" * 300 + "* (Quantity: 1)",
+    "item " + "(" * 50 + "x" + ")" * 50,
+]
+
+
+# Long pasted text that makes the reference patterns backtrack for seconds
+# (or much longer); only the hardened classifier is timed on these
+PATHOLOGICAL_MESSAGES = {
+    "long item before (": "item (" + "x" * 30000 + ")",
+    "many open (": "item " + "a (" * 4000 + ")",
+    "repeated added: groups": ("Purchase request added: x (" + "Quantity: 1 Catalog #: 2 " * 3 + ",x)") * 400,
+    "repeated ( groups": ("x (" + "Quantity: 1 Catalog #: 2 " * 3 + ",x)") * 500,
+    "long digit run": "item *thing* " + "1" * 30000,
+    "cat without colon": "item *thing* " + "cat " * 8000,
+    "unfinished bot header": ("*New Purchase Request by " + "x" * 20) * 1500,
+    "csv dump": "catalog,quantity,item\n" + "\n".join(f'{i},abc{i},"thing {i}"' for i in range(1500)),
+}
+
+
+def load_message_corpus(path):
+    """Read messages from a JSON list or a JSON-lines file (e.g. the extractor's spool)."""
+    with open(path, "r") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    return data.get("messages", []) if isinstance(data, dict) else data
+
+
+def time_parser(parse, texts, repeat):
+    """Best-of-repeat time to run parse over every text; return (seconds, results)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [parse(text) for text in texts]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def cmd_classifier(args):
+    import extract_historical_requests as extractor
+    from message_classifier import Classifier, classify, hardened_patterns, DEFAULT_TIME_BUDGET_SECONDS
+    hardened = Classifier(hardened_patterns())
+
+    print("🧪 Message classifier: reference parser chain vs message_classifier.classify")
+    corpora = [("golden messages", list(GOLDEN_MESSAGES))]
+    corpora.append((f"synthetic channel ({args.messages})",
+                    [m.get("text", "") for m in make_synthetic_channel(args.messages, seed=3)]))
+    for path in args.corpus:
+        corpora.append((os.path.basename(path), [m.get("text", "") for m in load_message_corpus(path)]))
+
+    ok = True
+    for name, texts in corpora:
+        reference_time, expected = time_parser(extractor.parse_purchase_request, texts, args.repeat)
+        classifier_time, actual = time_parser(classify, texts, args.repeat)
+        hardened_time, hardened_actual = time_parser(hardened.classify, texts, args.repeat)
+        mismatches = [text for text, a, b in zip(texts, expected, actual) if a != b]
+        hardened_differs = sum(1 for a, b in zip(expected, hardened_actual) if a != b)
+        ok = ok and not mismatches
+
+        found = sum(1 for r in expected if r)
+        rates = [len(texts) / t if t else 0.0 for t in (reference_time, classifier_time, hardened_time)]
+        speedup = rates[1] / rates[0] if rates[0] else 0.0
+        print(f"   {'❌' if mismatches else '✅'} {name}: {len(texts)} messages, {found} requests, "
+              f"reference {rates[0]:,.0f} msg/s, classifier {rates[1]:,.0f} msg/s ({speedup:.1f}x), "
+              f"hardened {rates[2]:,.0f} msg/s")
+        for text in mismatches[:5]:
+            print(f"      differs: {text[:100]!r}")
+        if hardened_differs:
+            print(f"      hardened mode differs on {hardened_differs} messages (fields over its length caps)")
+
+    # Every pathological message must finish within about one budget
+    budget = DEFAULT_TIME_BUDGET_SECONDS
+    print(f"\n⏱️  Hardened mode on pathological messages ({budget * 1000:.0f} ms budget)")
+    budgeted = Classifier(hardened_patterns(), time_budget=budget)
+    for name, text in PATHOLOGICAL_MESSAGES.items():
+        start = time.perf_counter()
+        budgeted.classify(text, ref=name)
+        elapsed = time.perf_counter() - start
+        bounded = elapsed < 2 * budget
+        ok = ok and bounded
+        print(f"   {'✅' if bounded else '❌'} {name}: {len(text):,} chars in {elapsed * 1000:.1f} ms")
+    for record in budgeted.slow_messages:
+        print(f"      🐢 {record['ref']}: {record['elapsed_ms']} ms, stopped at {record['stopped_at'] or '-'}")
+    return 0 if ok else 1
+
+
+def cmd_parse(args):
+    from message_classifier import Classifier, classify_in_pool, hardened_patterns, DEFAULT_TIME_BUDGET_SECONDS
+
+    print(f"⚙️  Parallel parse stage: {args.messages} synthetic messages, hardened mode "
+          f"({os.cpu_count()} CPUs)")
+    messages = make_synthetic_channel(args.messages, seed=5)
+    items = [(m.get("text", ""), m.get("ts", "")) for m in messages]
+
+    serial = Classifier(hardened_patterns(), time_budget=DEFAULT_TIME_BUDGET_SECONDS)
+    start = time.perf_counter()
+    expected = [serial.classify(text, ref) for text, ref in items]
+    serial_time = time.perf_counter() - start
+    print(f"   serial: {serial_time:.2f}s ({len(items) / serial_time:,.0f} msg/s)")
+
+    ok = True
+    for workers in args.workers:
+        start = time.perf_counter()
+        parsed, _ = classify_in_pool(items, workers, time_budget=DEFAULT_TIME_BUDGET_SECONDS)
+        elapsed = time.perf_counter() - start
+        same = parsed == expected
+        ok = ok and same
+        print(f"   {'✅' if same else '❌'} {workers:>2} workers: {elapsed:.2f}s "
+              f"({len(items) / elapsed:,.0f} msg/s), {serial_time / elapsed:.2f}x serial")
+    return 0 if ok else 1
+
+
+def cmd_requester(args):
+    import extract_historical_requests as extractor
+
+    print("🔎 Requester attribution: linear find_original_requester vs SlashCommandIndex")
+    ok = True
+    for message_count in args.messages:
+        for max_gap in args.max_gap:
+            messages = make_synthetic_channel(message_count, max_gap=max_gap)
+            same, line = compare_requester_lookups(extractor, messages)
+            ok = ok and same
+            print(f"   {'✅' if same else '❌'} {message_count:>7} messages, gaps <= {max_gap:>4.0f}s, {line}")
+    return 0 if ok else 1
+
+
+def fill_request_db(db, request_count, seed=3, start_ts=1577836800.0, years=5):
+    """Add request_count synthetic requests spread over years; a third are slash commands."""
+    rnd = random.Random(seed)
+    span = years * 365 * 24 * 3600
+    batch = {}
+    for position in range(request_count):
+        ts = start_ts + span * position / request_count
+        month = time.strftime("%Y-%m", time.localtime(ts))
+        record = {
+            "item_name": f"{rnd.choice(SYNTHETIC_ITEMS)} {rnd.randint(1, 500)}",
+            "quantity": str(rnd.randint(1, 9)),
+            "catalog_number": f"{rnd.choice(['CAT', 'AB', 'ZX'])}-{rnd.randint(100, 99999)}",
+            "link": "https://example.com",
+            "date_of_request": time.strftime("%Y-%m-%d", time.localtime(ts)),
+        }
+        if position % 3 == 0:
+            db.add_request(record, user_id=f"U{position % 12:04d}", month=month, submitted_at=ts)
+        else:
+            record.update(slack_timestamp=f"{ts:.6f}", requester_name=f"Person {position % 12}")
+            batch.setdefault(month, []).append(record)
+    for month, records in batch.items():
+        db.import_historical(month, records)
+
+
+def brute_force_search(db, query, source=None):
+    """Row ids matching query by scanning every row, newest first (reference for the index)."""
+    from request_search import tokenize
+
+    words = tokenize(query)
+    matches = []
+    for row in db.rows_after(0, "id, ts, source, item_name, catalog_number"):
+        if source and row["source"] != source:
+            continue
+        row_words = tokenize(row["item_name"]) + tokenize(row["catalog_number"])
+        if words and all(any(w.startswith(word) for w in row_words) for word in words):
+            matches.append((row["ts"], row["id"]))
+    return [row_id for _, row_id in sorted(matches, reverse=True)]
+
+
+def cmd_search(args):
+    from request_db import RequestDB, DB_FILE_NAME
+    from request_search import RequestSearchIndex
+
+    print(f"🔍 Request search: {args.requests:,} stored requests, {args.queries} queries")
+    folder = tempfile.mkdtemp(prefix="request_search_")
+    try:
+        db = RequestDB(os.path.join(folder, DB_FILE_NAME))
+        start = time.perf_counter()
+        fill_request_db(db, args.requests)
+        print(f"   filled database in {time.perf_counter() - start:.2f}s")
+
+        index = RequestSearchIndex(db)
+        start = time.perf_counter()
+        index.refresh()
+        print(f"   built index in {(time.perf_counter() - start) * 1000:.0f} ms "
+              f"({len(index.vocabulary):,} words)")
+
+        rnd = random.Random(11)
+        queries = []
+        for _ in range(args.queries):
+            item = rnd.choice(SYNTHETIC_ITEMS).split()
+            queries.append(rnd.choice([
+                item[0], " ".join(item), item[0][:3], f"{item[0]} {rnd.randint(1, 500)}",
+                f"{rnd.choice(['CAT', 'AB', 'ZX'])}-{rnd.randint(100, 99999)}", "no such thing",
+            ]))
+
+        ok = True
+        timings = []
+        for position, query in enumerate(queries):
+            page = 1 + position % 3
+            start = time.perf_counter()
+            result = index.search(query, page=page)
+            timings.append(time.perf_counter() - start)
+            if position < args.verify:
+                expected = brute_force_search(db, query)
+                page_ids = expected[(page - 1) * result["per_page"]:page * result["per_page"]]
+                if result["total"] != len(expected) or [r["id"] for r in result["results"]] != page_ids:
+                    ok = False
+                    print(f"   ❌ {query!r} page {page}: {result['total']} results, expected {len(expected)}")
+
+        timings.sort()
+        p50 = timings[len(timings) // 2] * 1000
+        p95 = timings[int(len(timings) * 0.95)] * 1000
+        print(f"   {'✅' if ok else '❌'} {min(args.verify, len(queries))} queries match a full scan")
+        print(f"   query latency: p50 {p50:.1f} ms, p95 {p95:.1f} ms, max {timings[-1] * 1000:.1f} ms")
+
+        db.add_request({"item_name": "Brand new reagent", "quantity": "1", "catalog_number": "NEW-1",
+                        "link": "", "date_of_request": ""}, user_id="U0001")
+        start = time.perf_counter()
+        found = index.search("brand new reagent")["total"]
+        incremental = (time.perf_counter() - start) * 1000
+        ok = ok and found == 1
+        print(f"   {'✅' if found == 1 else '❌'} a newly saved request is found {incremental:.1f} ms later "
+              f"without a rebuild ({index.rebuilds} rebuilds)")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def scan_for_duplicates(rows, item_name, catalog_number, cutoff):
+    """Ids of rows since cutoff that DuplicateIndex should flag, by checking every row."""
+    from duplicate_index import normalize_catalog
+    from requester_index import normalize_item, items_match
+
+    catalog = normalize_catalog(catalog_number)
+    clean_item = normalize_item(item_name)
+    words = set(clean_item.split())
+    flagged = set()
+    for row in rows:
+        if row["ts"] < cutoff:
+            continue
+        row_item = normalize_item(row["item_name"])
+        row_words = set(row_item.split())
+        if (catalog and normalize_catalog(row["catalog_number"]) == catalog) or \
+                items_match(clean_item, words, row_item, row_words):
+            flagged.add(row["id"])
+    return flagged
+
+
+def cmd_duplicates(args):
+    from request_db import RequestDB, DB_FILE_NAME
+    from duplicate_index import DuplicateIndex
+
+    print(f"🧾 Duplicate detection: {args.requests:,} stored requests, {args.window_days:g}-day window")
+    folder = tempfile.mkdtemp(prefix="duplicate_index_")
+    try:
+        db = RequestDB(os.path.join(folder, DB_FILE_NAME))
+        fill_request_db(db, args.requests)
+        rows = list(db.rows_after(0))
+        now = max(row["ts"] for row in rows) + 1
+        window_seconds = args.window_days * 24 * 3600
+
+        index = DuplicateIndex(db, window_seconds=window_seconds)
+        start = time.perf_counter()
+        index.warm(now=now)
+        print(f"   warmed in {(time.perf_counter() - start) * 1000:.0f} ms ({len(index.indexed_ids):,} requests)")
+
+        rnd = random.Random(17)
+        checks = [(rnd.choice(rows)["item_name"], f"CAT-{rnd.randint(100, 99999)}") for _ in range(args.checks)]
+        ok = True
+        start = time.perf_counter()
+        found = [index.find_duplicates(item, catalog, now=now, limit=None) for item, catalog in checks]
+        indexed_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for (item, catalog), duplicates in zip(checks[:args.verify], found):
+            expected = scan_for_duplicates(rows, item, catalog, now - window_seconds)
+            ok = ok and len(duplicates) == len(expected)
+        scan_time = (time.perf_counter() - start) / max(min(args.verify, len(checks)), 1)
+
+        flagged = sum(1 for duplicates in found if duplicates)
+        print(f"   {'✅' if ok else '❌'} {min(args.verify, len(checks))} checks match a scan of every request")
+        print(f"   index: {indexed_time / len(checks) * 1000:.2f} ms per check, "
+              f"scan: {scan_time * 1000:.1f} ms per check ({flagged}/{len(checks)} flagged)")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def cmd_report(args):
+    from request_db import RequestDB, DB_FILE_NAME
+    from reporting import ReportCache, CACHE_FILE_NAME, by_user, by_catalog, merged_totals
+
+    def reports(cache):
+        return by_user(None, cache.totals), by_catalog(None, cache.totals)
+
+    print(f"📊 Report cache: {args.requests:,} stored requests")
+    folder = tempfile.mkdtemp(prefix="report_cache_")
+    try:
+        db = RequestDB(os.path.join(folder, DB_FILE_NAME))
+        fill_request_db(db, args.requests)
+        cache_path = os.path.join(folder, CACHE_FILE_NAME)
+
+        timings = []
+        for label in ("cold", "cached"):
+            start = time.perf_counter()
+            cache = ReportCache(db, cache_path)
+            if cache.refresh():
+                cache.save()
+            before = reports(cache)
+            timings.append(f"{label} {time.perf_counter() - start:.2f}s ({len(cache.recomputed)} months re-read)")
+
+        latest_month = max(cache.months)
+        db.add_request({"item_name": "New reagent", "quantity": "3 boxes", "catalog_number": "NEW-1",
+                        "link": "", "date_of_request": ""}, user_id="U0001", month=latest_month)
+        start = time.perf_counter()
+        cache = ReportCache(db, cache_path)
+        cache.refresh()
+        cache.save()
+        incremental = reports(cache)
+        timings.append(f"one new request {time.perf_counter() - start:.2f}s ({len(cache.recomputed)} months re-read)")
+
+        full = ReportCache(db, os.path.join(folder, "full.json"))
+        full.refresh()
+        merged = merged_totals(full.selected())
+        same = (incremental == reports(full) == (by_user(None, merged), by_catalog(None, merged))
+                and incremental != before)
+        print(f"   {', '.join(timings)}")
+        print(f"   {'✅' if same else '❌'} incremental report matches a full recompute")
+        return 0 if same else 1
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def cmd_archive(args):
+    import glob
+    from request_archive import RequestArchive, write_archive
+    from request_db import HISTORICAL_PREFIX, write_historical_views
+
+    print(f"📦 Columnar archive: {args.requests:,} historical requests in monthly files vs one archive")
+    folder = tempfile.mkdtemp(prefix="request_archive_")
+    try:
+        rnd = random.Random(23)
+        formats = ["slash_command", "current_bot", "alternative"]
+        requests_by_month = {}
+        start_ts = 1704067200
+        for position in range(args.requests):
+            ts = start_ts + position * (365 * 24 * 3600 // args.requests)
+            month = time.strftime("%Y-%m", time.gmtime(ts))
+            user = rnd.randint(0, 40)
+            requests_by_month.setdefault(month, []).append({
+                "item_name": f"{rnd.choice(SYNTHETIC_ITEMS)} {rnd.randint(1, 500)}", "quantity": str(rnd.randint(1, 9)),
+                "catalog_number": f"CAT-{rnd.randint(100, 99999)}", "link": f"https://example.com/{position}",
+                "date_of_request": time.strftime("%Y-%m-%d", time.gmtime(ts)), "slack_timestamp": f"{ts}.{position % 999999:06d}",
+                "format_type": rnd.choice(formats), "confidence": rnd.choice(["high", "medium"]),
+                "extracted_date": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts)), "requester_name": f"Person {user}",
+                "original_user_id": f"U{user:04d}",
+            })
+            # Like extracted requests: bot posts carry no confidence, free-text ones keep
+            # their message, and some requesters can't be resolved
+            request = requests_by_month[month][-1]
+            if request["format_type"] == "current_bot":
+                del request["confidence"]
+            elif request["format_type"] == "alternative":
+                request["message_text"] = f"could someone order {request['item_name']}"
+            if user == 0:
+                request["requester_name"] = None
+        for month, requests in requests_by_month.items():
+            write_historical_views(folder, month, requests)
+        path = os.path.join(folder, "historical_requests_2024.reqarc")
+        write_archive(path, [req for requests in requests_by_month.values() for req in requests])
+
+        text_size = sum(os.path.getsize(p) for p in glob.glob(os.path.join(folder, f"{HISTORICAL_PREFIX}_*")))
+        archive_size = os.path.getsize(path)
+        print(f"   size: JSON + CSV {text_size / 1e6:.1f} MB, archive {archive_size / 1e6:.1f} MB "
+              f"({text_size / archive_size:.1f}x smaller)")
+
+        start = time.perf_counter()
+        expected = {}
+        for json_file in sorted(glob.glob(os.path.join(folder, f"{HISTORICAL_PREFIX}_*.json"))):
+            with open(json_file, 'r') as f:
+                for req in json.load(f):
+                    expected[req["format_type"]] = expected.get(req["format_type"], 0) + 1
+        json_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with RequestArchive(path) as archive:
+            counts = archive.column("format_type").counts()
+            column_time = time.perf_counter() - start
+            same_records = list(archive.records()) == sorted(
+                (req for requests in requests_by_month.values() for req in requests),
+                key=lambda req: float(req["slack_timestamp"]))
+        ok = counts == expected and same_records
+        print(f"   requests per format_type: monthly JSON {json_time * 1000:.0f} ms, "
+              f"archive column {column_time * 1000:.0f} ms")
+        print(f"   {'✅' if ok else '❌'} archive records and counts match the monthly files")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def cmd_metrics(args):
+    import threading
+    from metrics import Registry
+
+    print(f"📈 Metric hooks: {args.observations:,} timed blocks on each of {args.threads} threads")
+    registry = Registry()
+    histogram = registry.histogram("bench_seconds", "Benchmark stage latency", ["stage"])
+    counter = registry.counter("bench_total", "Benchmark events", ["kind"])
+
+    start = time.perf_counter()
+    for _ in range(args.observations):
+        pass
+    baseline = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(args.observations):
+        with histogram.time("single"):
+            pass
+    timed = time.perf_counter() - start
+    print(f"   timed block: {(timed - baseline) / args.observations * 1e6:.2f} µs each (single thread)")
+
+    def record():
+        for position in range(args.observations):
+            with histogram.time("threaded"):
+                pass
+            counter.inc("even" if position % 2 == 0 else "odd")
+
+    threads = [threading.Thread(target=record) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total = args.observations * args.threads
+    print(f"   {total:,} timed blocks + counter increments across threads in {elapsed:.2f} s "
+          f"({elapsed / total * 1e6:.2f} µs each)")
+
+    start = time.perf_counter()
+    text = registry.render()
+    render_ms = (time.perf_counter() - start) * 1000
+    ok = (histogram.count("threaded") == total
+          and counter.value("even") + counter.value("odd") == total
+          and f'bench_seconds_bucket{{stage="threaded",le="+Inf"}} {total}' in text)
+    print(f"   render: {render_ms:.2f} ms, {len(text.splitlines())} lines")
+    print(f"   {'✅' if ok else '❌'} no observations lost under concurrent updates")
+    return 0 if ok else 1
+
+
+def cmd_storage(args):
+    print("💾 Request database multi-process stress test")
+    results = [run_storage_stress(n, args.per_process) for n in args.processes]
+    return 0 if all(results) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress tests and benchmarks for the purchase request tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    storage = subparsers.add_parser("storage", help="parallel writers to the request database")
+    storage.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    storage.add_argument("--per-process", type=int, default=200)
+    storage.set_defaults(func=cmd_storage)
+
+    requester = subparsers.add_parser("requester", help="requester attribution, linear scan vs timestamp index")
+    requester.add_argument("--messages", type=int, nargs="+", default=[2000, 20000, 100000])
+    requester.add_argument("--max-gap", type=float, nargs="+", default=[30.0, 2.0],
+                           help="largest gap between messages in seconds (smaller = busier channel)")
+    requester.set_defaults(func=cmd_requester)
+
+    classifier = subparsers.add_parser("classifier", help="message classifier against the reference parsers")
+    classifier.add_argument("--messages", type=int, default=20000, help="size of the synthetic channel")
+    classifier.add_argument("--corpus", nargs="*", default=[],
+                            help="extra message files (JSON list or .jsonl) checked as golden input")
+    classifier.add_argument("--repeat", type=int, default=3)
+    classifier.set_defaults(func=cmd_classifier)
+
+    parse = subparsers.add_parser("parse", help="process-pool parse stage against a serial run")
+    parse.add_argument("--messages", type=int, default=200000)
+    parse.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parse.set_defaults(func=cmd_parse)
+
+    search = subparsers.add_parser("search", help="request search index against a full scan")
+    search.add_argument("--requests", type=int, default=200000)
+    search.add_argument("--queries", type=int, default=500)
+    search.add_argument("--verify", type=int, default=50, help="queries checked against a full scan")
+    search.set_defaults(func=cmd_search)
+
+    duplicates = subparsers.add_parser("duplicates", help="duplicate-order index against a full scan")
+    duplicates.add_argument("--requests", type=int, default=200000)
+    duplicates.add_argument("--window-days", type=float, default=30)
+    duplicates.add_argument("--checks", type=int, default=1000)
+    duplicates.add_argument("--verify", type=int, default=50, help="checks compared with a full scan")
+    duplicates.set_defaults(func=cmd_duplicates)
+
+    report = subparsers.add_parser("report", help="cached month aggregates against a full recompute")
+    report.add_argument("--requests", type=int, default=200000)
+    report.set_defaults(func=cmd_report)
+
+    archive = subparsers.add_parser("archive", help="yearly columnar archive against the monthly files")
+    archive.add_argument("--requests", type=int, default=100000)
+    archive.set_defaults(func=cmd_archive)
+
+    metrics = subparsers.add_parser("metrics", help="cost of the /metrics timing hooks")
+    metrics.add_argument("--observations", type=int, default=200000, help="timed blocks per thread")
+    metrics.add_argument("--threads", type=int, default=4)
+    metrics.set_defaults(func=cmd_metrics)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
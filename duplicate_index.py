@@ -0,0 +1,211 @@
+"""
+Duplicate-order detection for new purchase requests.
+
+DuplicateIndex keeps the requests of the last DUPLICATE_WINDOW_DAYS in
+memory, keyed by normalized catalog number, item name, item name word and
+item name trigram. A new request is a likely duplicate of an earlier one
+when the catalog numbers match, or when the item names match the way the
+extractor matches bot messages to slash commands (requester_index.items_match:
+same name, one contained in the other, or two shared words).
+
+Each check only compares the requests that can match, instead of scanning
+the monthly files: those with the same catalog number, those sharing a word
+(two shared words), those whose name is a substring of the new name (looked
+up by name), and those containing the new name ("glove" in "nitrile
+gloves"), which must hold every trigram of it, so the rarest trigram's
+requests are enough.
+
+The bot's channel posts of slash command submissions, read back by the
+extractor, are not indexed, so an earlier order is listed once (see
+RequestDB.echo_ids).
+
+The index is warmed from the request database in the background (checks
+made before that finish are skipped) and reads the rows saved since its
+last check before each one, so requests saved by other worker processes or
+by the extractor are seen too. After an extractor save, which can change
+rows in place, it is loaded again.
+"""
+
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+from requester_index import normalize_item, items_match
+
+DEFAULT_WINDOW_DAYS = 30
+NGRAM_LENGTH = 3
+MAX_REPORTED_DUPLICATES = 3
+# Drop expired entries from every key this often, so words that are never checked don't pile up
+PRUNE_EVERY_CHECKS = 500
+# Catalog numbers people type when there isn't one
+PLACEHOLDER_CATALOG_NUMBERS = {"", "na", "none", "tbd", "unknown", "0"}
+
+
+def item_ngrams(clean_item):
+    """Character trigrams of a normalized item name."""
+    return {clean_item[i:i + NGRAM_LENGTH] for i in range(len(clean_item) - NGRAM_LENGTH + 1)}
+
+
+def normalize_catalog(catalog_number):
+    """Catalog number without case, spaces or punctuation; None for placeholders."""
+    clean = normalize_item(catalog_number).replace(" ", "")
+    return None if clean in PLACEHOLDER_CATALOG_NUMBERS else clean
+
+
+class DuplicateIndex:
+    """Recent requests indexed by catalog number, item name, item name word and trigram."""
+
+    def __init__(self, db, window_seconds=DEFAULT_WINDOW_DAYS * 24 * 3600):
+        self.db = db
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self.by_catalog = {}  # normalized catalog number -> deque of entries
+        self.by_word = {}     # item name word -> deque of entries
+        self.by_item = {}     # normalized item name -> deque of entries
+        self.by_ngram = {}    # item name trigram -> deque of entries
+        self.item_lengths = set()  # lengths of the names in by_item
+        self.indexed_ids = set()
+        self.last_id = 0
+        self.revision = None  # db.historical_revision() the entries were loaded at
+        self.ready = threading.Event()
+        self.checks = 0
+        self.flagged = 0
+
+    def _add_row(self, row, cutoff, echoes=()):
+        self.last_id = max(self.last_id, row["id"])
+        if row["ts"] < cutoff or row["id"] in self.indexed_ids or row["id"] in echoes:
+            return
+        self.indexed_ids.add(row["id"])
+        clean_item = normalize_item(row["item_name"])
+        entry = {
+            "id": row["id"],
+            "ts": row["ts"],
+            "item_name": row["item_name"] or "",
+            "catalog_number": row["catalog_number"] or "",
+            "requester": row["user_name"] or row["user_id"] or "someone",
+            "clean_item": clean_item,
+            "catalog": normalize_catalog(row["catalog_number"]),
+            "words": set(clean_item.split()),
+        }
+        if entry["catalog"]:
+            self.by_catalog.setdefault(entry["catalog"], deque()).append(entry)
+        for word in entry["words"]:
+            self.by_word.setdefault(word, deque()).append(entry)
+        if clean_item:
+            self.by_item.setdefault(clean_item, deque()).append(entry)
+            self.item_lengths.add(len(clean_item))
+        for ngram in item_ngrams(clean_item):
+            self.by_ngram.setdefault(ngram, deque()).append(entry)
+
+    def _load(self, cutoff):
+        """Replace the entries with the requests saved within the window; caller holds the lock."""
+        for index in (self.by_catalog, self.by_word, self.by_item, self.by_ngram, self.item_lengths,
+                      self.indexed_ids):
+            index.clear()
+        self.revision = self.db.historical_revision()
+        # Read before the rows, so a row saved in between is picked up by the next refresh
+        last_id = self.db.max_id()
+        echoes = self.db.echo_ids(since=cutoff)
+        for row in reversed(self.db.find(since=cutoff)):
+            self._add_row(row, cutoff, echoes)
+        self.last_id = last_id
+
+    def warm(self, now=None):
+        """Load the requests saved within the window; checks are skipped until this is done."""
+        cutoff = (now or time.time()) - self.window_seconds
+        with self._lock:
+            self._load(cutoff)
+        self.ready.set()
+
+    def refresh(self, now=None):
+        """Index the rows saved since the last refresh (reload after an extractor save)."""
+        if not self.ready.is_set():
+            return
+        cutoff = (now or time.time()) - self.window_seconds
+        with self._lock:
+            # The extractor upserts rows in place, so entries may hold old item names
+            if self.db.historical_revision() != self.revision:
+                self._load(cutoff)
+            elif self.db.max_id() > self.last_id:
+                echoes = self.db.echo_ids(after_id=self.last_id)
+                for row in self.db.rows_after(self.last_id):
+                    self._add_row(row, cutoff, echoes)
+
+    def _prune(self, cutoff):
+        for index in (self.by_catalog, self.by_word, self.by_item, self.by_ngram):
+            for key in list(index):
+                if not self._recent(index[key], cutoff):
+                    del index[key]
+        self.item_lengths = {len(clean_item) for clean_item in self.by_item}
+
+    def _recent(self, entries, cutoff):
+        # Entries are appended roughly in time order, so expired ones collect at the left
+        while entries and entries[0]["ts"] < cutoff:
+            self.indexed_ids.discard(entries.popleft()["id"])
+        return [entry for entry in entries if entry["ts"] >= cutoff]
+
+    def _item_candidates(self, clean_item, words):
+        """Entry deques holding every request whose name can match clean_item."""
+        candidates = [self.by_word.get(word, ()) for word in words]
+        # Names contained in the new one; only substrings as long as some indexed name can be one
+        for length in self.item_lengths:
+            for start in range(len(clean_item) - length + 1):
+                entries = self.by_item.get(clean_item[start:start + length])
+                if entries:
+                    candidates.append(entries)
+        # Names containing the new one hold all of its trigrams
+        ngrams = item_ngrams(clean_item)
+        if ngrams:
+            candidates.append(min((self.by_ngram.get(ngram, ()) for ngram in ngrams), key=len))
+        elif clean_item:
+            candidates.extend(self.by_item.values())
+        return candidates
+
+    def find_duplicates(self, item_name, catalog_number, now=None, limit=MAX_REPORTED_DUPLICATES):
+        """Earlier requests within the window that look like this one, newest first.
+
+        Each result is a dict with item_name, catalog_number, requester, ts and
+        reason ("catalog" or "item"). Returns no results until warm() is done.
+        """
+        if not self.ready.is_set():
+            return []
+        now = now or time.time()
+        cutoff = now - self.window_seconds
+        self.refresh(now)
+        catalog = normalize_catalog(catalog_number)
+        clean_item = normalize_item(item_name)
+        words = set(clean_item.split())
+
+        with self._lock:
+            self.checks += 1
+            if self.checks % PRUNE_EVERY_CHECKS == 0:
+                self._prune(cutoff)
+            matches = {}
+            if catalog:
+                for entry in self._recent(self.by_catalog.get(catalog, ()), cutoff):
+                    matches[entry["id"]] = (entry, "catalog")
+            for entries in self._item_candidates(clean_item, words):
+                for entry in self._recent(entries, cutoff):
+                    if entry["id"] not in matches and items_match(clean_item, words, entry["clean_item"], entry["words"]):
+                        matches[entry["id"]] = (entry, "item")
+            if matches:
+                self.flagged += 1
+
+        ranked = sorted(matches.values(), key=lambda match: match[0]["ts"], reverse=True)[:limit]
+        return [{"item_name": entry["item_name"], "catalog_number": entry["catalog_number"],
+                 "requester": entry["requester"], "ts": entry["ts"], "reason": reason}
+                for entry, reason in ranked]
+
+
+def format_duplicate_warning(duplicates):
+    """Ephemeral warning listing likely duplicates ('' when there are none)."""
+    if not duplicates:
+        return ""
+    lines = ["⚠️ *This looks like it may already have been ordered:*"]
+    for duplicate in duplicates:
+        when = datetime.fromtimestamp(duplicate["ts"]).strftime("%Y-%m-%d")
+        catalog = f" [{duplicate['catalog_number']}]" if duplicate["catalog_number"] else ""
+        reason = "same catalog #" if duplicate["reason"] == "catalog" else "similar item"
+        lines.append(f"• *{duplicate['item_name']}*{catalog} by {duplicate['requester']} on {when} ({reason})")
+    return "\n".join(lines)
@@ -4,40 +4,142 @@ Link User Names to Historical Purchase Requests
 
 This script extracts all unique user IDs from the historical data,
 creates a mapping file for real names, and updates the CSV files.
+
+    python link_user_names.py                  # interactive: asks before updating CSVs
+    python link_user_names.py --batch          # for cron: update mapping and CSVs, no prompts
+    python link_user_names.py --batch --mapping-only
+
+Historical JSON files are read one request at a time rather than loaded
+whole. The user IDs found in each file are kept in user_id_index.json with
+the file's size and modification time, so later runs only read files that
+changed (--rescan reads them all again).
+
+CSV files are rewritten row by row into a temporary file that replaces the
+original only once it is complete, so an interrupted run never leaves a
+half-written CSV. user_link_state.json remembers each file's size and
+modification time and the names written into it; later runs only rewrite
+files that changed since, or that contain a user whose mapped name changed.
 """
 
 import os
+import re
 import json
 import csv
+import sys
 import glob
+import argparse
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from slack_client import SlackClient
+from request_store import atomic_write
+from user_directory import UserDirectory, list_display_names, CACHE_FILE_NAME
 
 # Paths
 BASE_DIR = "/Users/paul/Desktop/slackbot"
 HISTORICAL_FOLDER = os.path.join(BASE_DIR, "purchase_requests", "historical")
 MAPPING_FILE = os.path.join(BASE_DIR, "user_id_mapping.json")
+USER_CACHE_FILE = os.path.join(BASE_DIR, CACHE_FILE_NAME)
+# User IDs found in each historical JSON file, so unchanged files aren't read again
+USER_INDEX_FILE = os.path.join(HISTORICAL_FOLDER, "user_id_index.json")
+HISTORICAL_JSON_PATTERN = "historical_requests_*.json"
+JSON_READ_CHUNK_SIZE = 1 << 16
+_ITEM_SEPARATOR = re.compile(r'[\s,]*')
+# Names already written into each CSV, so unchanged files are skipped
+LINK_STATE_FILE = os.path.join(HISTORICAL_FOLDER, "user_link_state.json")
 
-def extract_unique_user_ids():
-    """Extract all unique user IDs from historical JSON files."""
-    user_ids = set()
-    user_stats = defaultdict(int)
-    
-    # Find all historical JSON files
-    json_files = glob.glob(os.path.join(HISTORICAL_FOLDER, "*.json"))
-    
+# CSV files rewritten at once
+UPDATE_WORKERS = 4
+
+# Optional: with a token, real names are pulled from users.list instead of placeholders
+SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN", "")
+
+def iter_json_array(path, chunk_size=JSON_READ_CHUNK_SIZE):
+    """Yield the items of a file holding one JSON array, reading it a chunk at a time."""
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f"{path} does not contain a JSON array")
+        position, at_eof = 1, False
+        while True:
+            # Skip whitespace and the comma between items
+            position = _ITEM_SEPARATOR.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if at_eof:
+                    raise
+                item = None
+            # An item that ends at the buffer's edge may be cut short; read on before trusting it
+            if item is None or (end == len(buffer) and not at_eof):
+                chunk = f.read(chunk_size)
+                at_eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield item
+            position = end
+
+def scan_json_file(json_file):
+    """Count requests per user ID in one historical JSON file."""
+    counts = defaultdict(int)
+    for request in iter_json_array(json_file):
+        user_id = request.get('original_user_id') or request.get('requester_name')
+        if user_id and user_id.startswith('U'):
+            counts[user_id] += 1
+    return dict(counts)
+
+def extract_unique_user_ids(rescan=False):
+    """Extract all unique user IDs from historical JSON files, reading only files that changed."""
+    index = {}
+    if os.path.exists(USER_INDEX_FILE) and not rescan:
+        try:
+            with open(USER_INDEX_FILE, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable {USER_INDEX_FILE}: {e}")
+
+    json_files = sorted(glob.glob(os.path.join(HISTORICAL_FOLDER, HISTORICAL_JSON_PATTERN)))
+    updated_index = {}
+    scanned = 0
     for json_file in json_files:
-        with open(json_file, 'r') as f:
-            data = json.load(f)
-            
-        for request in data:
-            user_id = request.get('original_user_id') or request.get('requester_name')
-            if user_id and user_id.startswith('U'):
-                user_ids.add(user_id)
-                user_stats[user_id] += 1
-    
-    return user_ids, user_stats
+        name = os.path.basename(json_file)
+        fingerprint = file_fingerprint(json_file)
+        entry = index.get(name)
+        if not entry or entry.get("fingerprint") != fingerprint:
+            entry = {"fingerprint": fingerprint, "counts": scan_json_file(json_file)}
+            scanned += 1
+        updated_index[name] = entry
+
+    if updated_index != index:
+        with atomic_write(USER_INDEX_FILE) as f:
+            json.dump(updated_index, f)
+    print(f"🔎 Read {scanned} of {len(json_files)} historical files ({len(json_files) - scanned} unchanged)")
+
+    user_stats = defaultdict(int)
+    for entry in updated_index.values():
+        for user_id, count in entry["counts"].items():
+            user_stats[user_id] += count
+    return set(user_stats), user_stats
 
-def create_mapping_file(user_ids, user_stats):
+def load_user_directory():
+    """Load the shared user directory cache, refreshing it from users.list if a token is set."""
+    slack_client = SlackClient(SLACK_BOT_TOKEN)
+    directory = UserDirectory(
+        fetch=None,
+        list_all=lambda: list_display_names(slack_client),
+        persist_path=USER_CACHE_FILE,
+    )
+    if SLACK_BOT_TOKEN:
+        try:
+            print(f"👥 Synced {directory.sync()} users from users.list")
+        except Exception as e:
+            print(f"⚠️  users.list sync failed, using cached names only: {e}")
+    return directory
+
+def create_mapping_file(user_ids, user_stats, directory=None, verbose=True):
     """Create a mapping file template for user names."""
     mapping = {}
     
@@ -46,16 +148,24 @@ def create_mapping_file(user_ids, user_stats):
         with open(MAPPING_FILE, 'r') as f:
             mapping = json.load(f)
     
-    # Add new user IDs with placeholder names
+    # Fill new user IDs (and untouched placeholders) from the user directory,
+    # falling back to placeholder names
     for user_id in user_ids:
-        if user_id not in mapping:
-            mapping[user_id] = f"User_{user_id[-4:]}"  # Use last 4 chars as placeholder
+        placeholder = f"User_{user_id[-4:]}"  # Use last 4 chars as placeholder
+        if mapping.get(user_id, placeholder) != placeholder:
+            continue
+        found, name = directory.get(user_id) if directory else (False, None)
+        mapping[user_id] = name if found and name else placeholder
     
     # Save the mapping file
-    with open(MAPPING_FILE, 'w') as f:
+    with atomic_write(MAPPING_FILE) as f:
         json.dump(mapping, f, indent=2)
     
     print(f"📝 User mapping file created: {MAPPING_FILE}")
+    placeholders = sum(1 for user_id in user_ids if mapping[user_id] == f"User_{user_id[-4:]}")
+    if not verbose:
+        print(f"👥 {len(user_ids)} users, {placeholders} still with placeholder names")
+        return mapping
     print("\n👥 User IDs found (with request counts):")
     for user_id in sorted(user_ids, key=lambda x: user_stats[x], reverse=True):
         current_name = mapping[user_id]
@@ -63,46 +173,105 @@ def create_mapping_file(user_ids, user_stats):
     
     return mapping
 
-def update_csv_files(mapping):
-    """Update all CSV files with real names from the mapping."""
-    csv_files = glob.glob(os.path.join(HISTORICAL_FOLDER, "*.csv"))
-    
-    for csv_file in csv_files:
-        print(f"📄 Updating: {os.path.basename(csv_file)}")
-        
-        # Read the CSV file
-        rows = []
-        with open(csv_file, 'r') as f:
-            reader = csv.DictReader(f)
+def file_fingerprint(path):
+    """(size, mtime in ns) of a file, used to tell whether it changed since the last run."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def load_link_state():
+    """Load the per-file state of earlier CSV updates ({} if there is none)."""
+    if os.path.exists(LINK_STATE_FILE):
+        try:
+            with open(LINK_STATE_FILE, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable {LINK_STATE_FILE}: {e}")
+    return {}
+
+def needs_update(csv_file, state, mapping):
+    """Whether a CSV changed since it was last updated or has a user whose name changed."""
+    entry = state.get(os.path.basename(csv_file))
+    if not entry or entry.get("fingerprint") != file_fingerprint(csv_file):
+        return True
+    return any(mapping.get(user_id) != name for user_id, name in entry.get("names", {}).items())
+
+def update_csv_file(csv_file, mapping):
+    """Rewrite one CSV with mapped names, streaming into a temp file; return its new state entry.
+
+    The entry holds the file's new fingerprint and, for every user ID in it,
+    the name that was written (None when the user isn't in the mapping).
+    """
+    names = {}
+    with open(csv_file, 'r', newline='') as source:
+        reader = csv.DictReader(source)
+        if not reader.fieldnames:
+            return {"fingerprint": file_fingerprint(csv_file), "names": names}
+        with atomic_write(csv_file, newline='') as target:
+            writer = csv.DictWriter(target, fieldnames=reader.fieldnames)
+            writer.writeheader()
             for row in reader:
                 # Update requester_name with mapped name
                 user_id = row.get('original_user_id') or row.get('requester_name')
                 if user_id in mapping:
                     row['requester_name'] = mapping[user_id]
-                rows.append(row)
-        
-        # Write back the updated CSV
-        if rows:
-            with open(csv_file, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-                writer.writeheader()
-                writer.writerows(rows)
+                # Unmapped users are kept as None, so mapping them later marks the file for update
+                names[user_id] = mapping.get(user_id)
+                writer.writerow(row)
+    return {"fingerprint": file_fingerprint(csv_file), "names": names}
+
+def update_csv_files(mapping, force=False):
+    """Update the CSV files that need the current mapping; return (updated, skipped) counts."""
+    csv_files = sorted(glob.glob(os.path.join(HISTORICAL_FOLDER, "*.csv")))
+    state = {} if force else load_link_state()
+    pending = [csv_file for csv_file in csv_files if needs_update(csv_file, state, mapping)]
+
+    for csv_file in pending:
+        print(f"📄 Updating: {os.path.basename(csv_file)}")
+    with ThreadPoolExecutor(max_workers=UPDATE_WORKERS) as executor:
+        for csv_file, entry in zip(pending, executor.map(lambda path: update_csv_file(path, mapping), pending)):
+            state[os.path.basename(csv_file)] = entry
+
+    # Forget files that no longer exist
+    existing = {os.path.basename(csv_file) for csv_file in csv_files}
+    state = {name: entry for name, entry in state.items() if name in existing}
+    with atomic_write(LINK_STATE_FILE) as f:
+        json.dump(state, f, indent=2)
+
+    skipped = len(csv_files) - len(pending)
+    if skipped:
+        print(f"⏭️  Skipped {skipped} CSV files that already have the current names")
+    return len(pending), skipped
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Link Slack user IDs in historical requests to real names.")
+    parser.add_argument("--batch", action="store_true",
+                        help="don't prompt: update the mapping and then the CSV files (for cron)")
+    parser.add_argument("--mapping-only", action="store_true", help="with --batch, leave the CSV files alone")
+    parser.add_argument("--rescan", action="store_true", help="read every historical JSON file again")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
     print("🔗 User Name Linking Tool")
     print("=" * 50)
     
     # Extract unique user IDs
-    user_ids, user_stats = extract_unique_user_ids()
+    user_ids, user_stats = extract_unique_user_ids(rescan=args.rescan)
     
     if not user_ids:
         print("❌ No user IDs found in historical data!")
-        return
+        return 1
     
     print(f"✅ Found {len(user_ids)} unique users")
     
     # Create/update mapping file
-    mapping = create_mapping_file(user_ids, user_stats)
+    mapping = create_mapping_file(user_ids, user_stats, load_user_directory(), verbose=not args.batch)
+
+    if args.batch:
+        if not args.mapping_only:
+            updated, skipped = update_csv_files(mapping)
+            print(f"✅ CSV files are up to date with mapped names ({updated} updated, {skipped} already current)")
+        return 0
     
     print("\n📝 Instructions:")
     print("1. Edit the file: user_id_mapping.json")
@@ -113,10 +282,11 @@ def main():
     choice = input("\n❓ Do you want to update CSV files with current mapping? (y/n): ").lower().strip()
     
     if choice == 'y':
-        update_csv_files(mapping)
-        print("\n✅ All CSV files updated with mapped names!")
+        updated, skipped = update_csv_files(mapping)
+        print(f"\n✅ CSV files are up to date with mapped names ({updated} updated, {skipped} already current)")
     else:
         print("\n💡 Run this script again after updating the mapping file to apply changes.")
+    return 0
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
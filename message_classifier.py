@@ -0,0 +1,477 @@
+"""
+Single-pass purchase request classifier.
+
+parse_purchase_request() in extract_historical_requests.py tries every
+parser in turn, and each of them builds its regular expressions from string
+literals on every call. Here all patterns are compiled once at import, and
+a prefilter on cheap substring checks sends each message only to the
+parsers that could possibly match it: "/purchase_request" for slash
+commands, the "*New Purchase Request by " header for the current bot format
+and the purchase keywords for the older free-form formats. Most chatter is
+rejected without running a single regular expression.
+
+classify() returns exactly what parse_purchase_request() returns for the
+same text; `python benchmarks.py classifier` checks that on a golden corpus
+and measures the throughput of both.
+
+Hardened mode
+-------------
+Several of the reference patterns backtrack badly on long pasted text: a
+lazy item name in front of "(", unbounded ".*?" gaps between optional
+groups, or "[^:]*:" without a colon in sight can make a single message take
+seconds. hardened_patterns() rewrites them so every match attempt does
+bounded work: fields and gaps are capped at a fixed number of characters,
+and the "(Quantity: X, Catalog #: Y)" formats only look inside one short
+parenthesis without nested parentheses. Those two patterns are also
+searched one anchor ("(" or "Purchase request added:") at a time, and a
+Classifier with a time_budget checks the clock between anchors and between
+fields. Once a message has used up its budget, parsing stops, whatever was
+found so far is kept with 'low' confidence and the message is recorded in
+slow_messages.
+
+On ordinary messages both modes give the same result. They differ only
+on fields longer than the caps and on parentheses inside the item name or
+nested inside the quantity/catalog group.
+"""
+
+import re
+import time
+
+# Slash command: "/purchase_request Item, Quantity, Catalog, Link, Date"
+SLASH_MARKER = '/purchase_request'
+_SLASH = re.compile(r'/purchase_request\s+(.+)', re.IGNORECASE)
+_STRIP_QUOTES = re.compile(r'[\*"\']')
+_SLASH_LINK = re.compile(r'<(https?://[^>]+)>')
+
+# Current bot format: "*New Purchase Request by {name}:*" and bullet fields
+CURRENT_MARKER = '*New Purchase Request by '
+CURRENT_FIELDS = ['item_name', 'quantity', 'catalog_number', 'link', 'date_of_request']
+
+# Older bot and free-text formats, only tried if one of these words appears
+PURCHASE_INDICATORS = ('purchase request', 'catalog', 'quantity', 'requested', 'added:', 'item')
+NOT_ITEMS = ('quantity', 'catalog', 'link', 'date')
+
+# Hardened mode limits
+HARDENED_MAX_FIELD_CHARS = 200
+HARDENED_MAX_GAP_CHARS = 200
+HARDENED_MAX_GROUP_CHARS = 100
+DEFAULT_TIME_BUDGET_SECONDS = 0.05
+SLOW_MESSAGE_SNIPPET_CHARS = 200
+
+_ALT_FLAGS = re.IGNORECASE | re.DOTALL
+
+
+def _has_all(*needles):
+    """Prefilter: every needle occurs in the lowercased text."""
+    return lambda lower: all(needle in lower for needle in needles)
+
+
+def _has_quote(lower):
+    return '"' in lower or "'" in lower
+
+
+# Prefilters of the free-form item patterns, in pattern order. A prefilter
+# only skips a pattern that cannot match because a literal it needs is missing.
+_ALT_ITEM_PREFILTERS = [
+    _has_all('purchase request added:', '(', ')'),
+    _has_all('(', ')'),
+    _has_all('product name:', '('),
+    _has_quote,
+    _has_all('*', '(', ')'),
+]
+
+
+class PatternSet:
+    """Compiled patterns for the current bot and free-form parsers."""
+
+    def __init__(self, current_header, current_fields, alt_items, alt_simple,
+                 alt_quantity, alt_catalog, alt_url, alt_dates, alt_item_windows=None):
+        self.current_header = re.compile(current_header)
+        self.current_fields = [(field, re.compile(pattern))
+                               for field, pattern in zip(CURRENT_FIELDS, current_fields)]
+        # window: (anchor pattern, reach before, reach after) for a search one anchor at a time
+        windows = alt_item_windows or [None] * len(alt_items)
+        self.alt_items = [(prefilter, re.compile(pattern, _ALT_FLAGS), window)
+                          for prefilter, pattern, window in zip(_ALT_ITEM_PREFILTERS, alt_items, windows)]
+        self.alt_simple = [(marker, re.compile(pattern)) for marker, pattern in alt_simple]
+        self.alt_quantity = [re.compile(pattern, re.IGNORECASE) for pattern in alt_quantity]
+        self.alt_catalog = [re.compile(pattern, re.IGNORECASE) for pattern in alt_catalog]
+        self.alt_url = re.compile(alt_url)
+        self.alt_dates = [re.compile(pattern, re.IGNORECASE) for pattern in alt_dates]
+
+
+# The patterns of the reference parsers, unchanged
+EXACT_PATTERNS = PatternSet(
+    current_header=r'\*New Purchase Request by (.+?):\*',
+    current_fields=[
+        r'• \*Item:\* (.+?)(?:\n|$)',
+        r'• \*Quantity:\* (.+?)(?:\n|$)',
+        r'• \*Catalog #:\* (.+?)(?:\n|$)',
+        r'• \*Link:\* (.+?)(?:\n|$)',
+        r'• \*Date:\* (.+?)(?:\n|$)',
+    ],
+    alt_items=[
+        # "Purchase request added: *item* (Quantity: X, Catalog #: Y)"
+        r'Purchase request added:\s*\*?["\']?([^*"\']+?)\*?["\']?\s*\((?:.*?Quantity:\s*["\']?([^,"\']+)["\']?)?(?:.*?Catalog #?:\s*["\']?([^,"\']+)["\']?)?\)',
+        # "Item Name (Quantity: X, Catalog: Y)"
+        r'\*?["\']?([^*"\'()]+?)\*?["\']?\s*\(\s*(?:Quantity:\s*["\']?([^,"\']+)["\']?)?(?:.*?Catalog[^:]*:\s*["\']?([^,"\']+)["\']?)?\)',
+        # "Product name: X (Quantity: Y)"
+        r'Product name:\s*\*?["\']?([^*"\']+?)\*?["\']?\s*\(\s*(?:Quantity:\s*["\']?([^,"\']+)["\']?)?',
+        # Quoted items with catalog numbers
+        r'["\']([^"\']+)["\'].*?(?:Catalog[^:]*:\s*["\']?([^,"\']+)["\']?)?.*?(?:Quantity:\s*["\']?([^,"\']+)["\']?)?',
+        # Items with asterisks and parentheses
+        r'\*([^*]+)\*\s*\([^)]*\)',
+    ],
+    alt_simple=[
+        ('*', r'\*([^*]+)\*'),
+        ('"', r'"([^"]+)"'),
+        ("'", r"'([^']+)'"),
+    ],
+    alt_quantity=[
+        r'quantity[:\s]+["\']?(\d+(?:\.\d+)?)["\']?',
+        r'qty[:\s]+["\']?(\d+(?:\.\d+)?)["\']?',
+        r'\(\s*quantity[:\s]*["\']?(\d+(?:\.\d+)?)["\']?',
+        r'(\d+)\s*(?:units?|pcs?|pieces?)',
+    ],
+    alt_catalog=[
+        r'catalog[^:]*:\s*["\']?([A-Z0-9\-_.]+)["\']?',
+        r'cat[^:]*:\s*["\']?([A-Z0-9\-_.]+)["\']?',
+        r'part[^:]*:\s*["\']?([A-Z0-9\-_.]+)["\']?',
+        r'#\s*([A-Z0-9\-_.]+)',
+    ],
+    alt_url=r'https?://[^\s\)>]+',
+    alt_dates=[
+        r'(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
+        r'(\d{4}-\d{1,2}-\d{1,2})',
+        r'on\s+["\']?([^"\']+)["\']?',
+    ],
+)
+
+
+def hardened_patterns(max_field_chars=HARDENED_MAX_FIELD_CHARS, max_gap_chars=HARDENED_MAX_GAP_CHARS,
+                      max_group_chars=HARDENED_MAX_GROUP_CHARS):
+    """The reference patterns with every field and gap capped, so no match attempt can run away.
+
+    {F} caps a field or a run of whitespace, {G} the text skipped between
+    fields and {P} the inside of a "(Quantity: X, Catalog: Y)" group.
+    Inside the group, "(?=(X))\\N" matches X without backtracking into it
+    (an atomic group that also works before Python 3.11); the first,
+    longest value is the one the reference patterns end up with whenever
+    they match at all. Patterns that are already linear (the simple quote
+    and asterisk scans, URLs, dates) are kept as they are.
+    """
+    def bounded(pattern):
+        return pattern.replace('{F}', str(max_field_chars)).replace('{G}', str(max_gap_chars)) \
+            .replace('{P}', str(max_group_chars))
+
+    # An item, its closing quote or asterisk and the whitespace before "("
+    item_reach = 2 * max_field_chars + 4
+    group_reach = max_group_chars + 2
+
+    return PatternSet(
+        current_header=bounded(r'\*New Purchase Request by (.{1,{F}}?):\*'),
+        current_fields=[bounded(pattern) for pattern in [
+            r'• \*Item:\* (.{1,{F}}?)(?:\n|$)',
+            r'• \*Quantity:\* (.{1,{F}}?)(?:\n|$)',
+            r'• \*Catalog #:\* (.{1,{F}}?)(?:\n|$)',
+            r'• \*Link:\* (.{1,{F}}?)(?:\n|$)',
+            r'• \*Date:\* (.{1,{F}}?)(?:\n|$)',
+        ]],
+        alt_items=[bounded(pattern) for pattern in [
+            r'Purchase request added:\s{0,{F}}\*?["\']?([^*"\'()]{1,{F}}?)\*?["\']?\s{0,{F}}\((?=[^()]{0,{P}}\))(?:[^()]*?Quantity:\s*["\']?(?=([^,"\'()]+))\2["\']?)?(?:[^()]*?Catalog #?:\s*["\']?(?=([^,"\'()]+))\3["\']?)?\)',
+            r'\*?["\']?([^*"\'()]{1,{F}}?)\*?["\']?\s{0,{F}}\((?=[^()]{0,{P}}\))\s*(?:Quantity:\s*["\']?(?=([^,"\'()]+))\2["\']?)?(?:[^()]*?Catalog[^:()]*:\s*["\']?(?=([^,"\'()]+))\3["\']?)?\)',
+            r'Product name:\s{0,{F}}\*?["\']?([^*"\']{1,{F}}?)\*?["\']?\s{0,{F}}\(\s{0,{F}}(?:Quantity:\s{0,{F}}["\']?([^,"\']{1,{F}})["\']?)?',
+            r'["\']([^"\']{1,{F}})["\'].{0,{G}}?(?:Catalog[^:]{0,{F}}:\s{0,{F}}["\']?([^,"\']{1,{F}})["\']?)?.{0,{G}}?(?:Quantity:\s{0,{F}}["\']?([^,"\']{1,{F}})["\']?)?',
+            r'\*([^*]{1,{F}})\*\s{0,{F}}\([^)]{0,{F}}\)',
+        ]],
+        alt_item_windows=[
+            (re.compile('Purchase request added:', re.IGNORECASE), 0,
+             len('Purchase request added:') + item_reach + group_reach),
+            (re.compile(r'\('), item_reach, group_reach),
+            None,
+            None,
+            None,
+        ],
+        alt_simple=[
+            ('*', r'\*([^*]+)\*'),
+            ('"', r'"([^"]+)"'),
+            ("'", r"'([^']+)'"),
+        ],
+        alt_quantity=[bounded(pattern) for pattern in [
+            r'quantity[:\s]{1,{F}}["\']?(\d{1,{F}}(?:\.\d{1,{F}})?)["\']?',
+            r'qty[:\s]{1,{F}}["\']?(\d{1,{F}}(?:\.\d{1,{F}})?)["\']?',
+            r'\(\s{0,{F}}quantity[:\s]{0,{F}}["\']?(\d{1,{F}}(?:\.\d{1,{F}})?)["\']?',
+            # Only start at the first digit of a run; a later start would fail the same way
+            r'(?<!\d)(\d{1,{F}})\s{0,{F}}(?:units?|pcs?|pieces?)',
+        ]],
+        alt_catalog=[bounded(pattern) for pattern in [
+            r'catalog[^:]{0,{F}}:\s{0,{F}}["\']?([A-Z0-9\-_.]{1,{F}})["\']?',
+            r'cat[^:]{0,{F}}:\s{0,{F}}["\']?([A-Z0-9\-_.]{1,{F}})["\']?',
+            r'part[^:]{0,{F}}:\s{0,{F}}["\']?([A-Z0-9\-_.]{1,{F}})["\']?',
+            r'#\s{0,{F}}([A-Z0-9\-_.]{1,{F}})',
+        ]],
+        alt_url=r'https?://[^\s\)>]+',
+        alt_dates=[bounded(pattern) for pattern in [
+            r'(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
+            r'(\d{4}-\d{1,2}-\d{1,2})',
+            r'on\s{1,{F}}["\']?([^"\']{1,{F}})["\']?',
+        ]],
+    )
+
+
+def parse_slash_command(message_text):
+    """Parse the /purchase_request slash command format."""
+    match = _SLASH.search(message_text)
+    if not match:
+        return None
+
+    parts = [part.strip() for part in match.group(1).strip().split(',')]
+    if len(parts) < 3:  # Need at least item, quantity, catalog
+        return None
+
+    extracted_data = {
+        'confidence': 'high',
+        'format_type': 'slash_command',
+        'item_name': _STRIP_QUOTES.sub('', parts[0]).strip(),
+        'quantity': _STRIP_QUOTES.sub('', parts[1]).strip(),
+        'catalog_number': _STRIP_QUOTES.sub('', parts[2]).strip(),
+    }
+
+    if len(parts) >= 4:
+        link = parts[3]
+        url_match = _SLASH_LINK.search(link)
+        if url_match:
+            extracted_data['link'] = url_match.group(1)
+        elif link.startswith('http'):
+            extracted_data['link'] = link
+
+    if len(parts) >= 5:
+        extracted_data['date_of_request'] = parts[4]
+
+    return extracted_data
+
+
+class Classifier:
+    """Routes each message to the parsers its prefilter allows.
+
+    patterns is EXACT_PATTERNS (the reference behaviour) or the result of
+    hardened_patterns(). With a time_budget in seconds, parsing of a message
+    stops once the budget is spent, and messages that went over it are
+    appended to slow_messages.
+    """
+
+    def __init__(self, patterns=EXACT_PATTERNS, time_budget=None):
+        self.patterns = patterns
+        self.time_budget = time_budget
+        self.slow_messages = []
+        self._started = 0.0
+        self._stopped_at = None
+
+    def _out_of_time(self, stage):
+        """True once the message has used up its time budget; remembers where."""
+        if self.time_budget is None:
+            return False
+        if self._stopped_at is None and time.perf_counter() - self._started > self.time_budget:
+            self._stopped_at = stage
+        return self._stopped_at is not None
+
+    def classify(self, message_text, ref=None):
+        """Return the parsed purchase request in a message, or None.
+
+        ref identifies the message in slow_messages (e.g. its Slack ts).
+        """
+        if self.time_budget is None:
+            return self._classify(message_text)
+
+        self._started = time.perf_counter()
+        self._stopped_at = None
+        extracted_data = self._classify(message_text)
+        elapsed = time.perf_counter() - self._started
+        if elapsed > self.time_budget:
+            self.slow_messages.append({
+                'ref': ref,
+                'length': len(message_text),
+                'elapsed_ms': round(elapsed * 1000, 1),
+                'stopped_at': self._stopped_at,
+                'found': bool(extracted_data),
+                'snippet': message_text[:SLOW_MESSAGE_SNIPPET_CHARS],
+            })
+        return extracted_data
+
+    def _classify(self, message_text):
+        lower = message_text.lower()
+
+        if SLASH_MARKER in lower:
+            extracted_data = parse_slash_command(message_text)
+            if extracted_data:
+                return extracted_data
+
+        if CURRENT_MARKER in message_text and not self._out_of_time('current_bot'):
+            extracted_data = self.parse_current_bot(message_text)
+            if extracted_data:
+                extracted_data['format_type'] = 'current_bot'
+                return extracted_data
+
+        if any(indicator in lower for indicator in PURCHASE_INDICATORS) \
+                and not self._out_of_time('alternative'):
+            extracted_data = self.parse_alternative(message_text, lower)
+            if extracted_data:
+                extracted_data['format_type'] = 'alternative'
+                return extracted_data
+
+        return None
+
+    def _search_by_anchor(self, pattern, text, anchor, reach_before, reach_after):
+        """pattern.search(text), one anchor at a time, checking the time budget in between.
+
+        Every match must contain an anchor and start at most reach_before
+        characters before the first anchor after its start and end at most
+        reach_after characters after it.
+        """
+        lo = 0
+        for anchor_match in anchor.finditer(text):
+            at = anchor_match.start()
+            if self._out_of_time('item'):
+                return None
+            match = pattern.search(text, max(lo, at - reach_before), at + reach_after)
+            if match:
+                # The same match without the window's end, as a plain search would find it
+                return pattern.match(text, match.start())
+            lo = at + 1
+        return None
+
+    def parse_current_bot(self, message_text):
+        """Parse the current bot format; every bullet field is required."""
+        header = self.patterns.current_header.search(message_text)
+        if not header:
+            return None
+
+        extracted_data = {'requester_name': header.group(1)}
+        for field, pattern in self.patterns.current_fields:
+            match = pattern.search(message_text)
+            if not match:
+                return None
+            extracted_data[field] = match.group(1).strip()
+        return extracted_data
+
+    def parse_alternative(self, message_text, lower):
+        """Parse the older bot and free-text formats; lower is message_text.lower()."""
+        patterns = self.patterns
+        item = None
+        for prefilter, pattern, window in patterns.alt_items:
+            if not prefilter(lower):
+                continue
+            if self._out_of_time('item'):
+                return None
+            if window:
+                match = self._search_by_anchor(pattern, message_text, *window)
+            else:
+                match = pattern.search(message_text)
+            if match and match.group(1):
+                item = match.groups()
+                break
+
+        extracted_data = {
+            'message_text': message_text,
+            'confidence': 'medium',
+            'format_type': 'bot_format',
+        }
+
+        if item:
+            extracted_data['item_name'] = item[0].strip()
+            if len(item) > 1 and item[1]:
+                extracted_data['quantity'] = item[1].strip()
+            if len(item) > 2 and item[2]:
+                extracted_data['catalog_number'] = item[2].strip()
+        else:
+            # Look for items in asterisks or quotes
+            for marker, pattern in patterns.alt_simple:
+                if marker not in message_text:
+                    continue
+                for match in pattern.findall(message_text):
+                    if len(match.strip()) > 3 and match.lower() not in NOT_ITEMS:
+                        extracted_data['item_name'] = match.strip()
+                        break
+                if 'item_name' in extracted_data:
+                    break
+            if 'item_name' not in extracted_data:
+                return None
+
+        for field, field_patterns in (('quantity', patterns.alt_quantity),
+                                      ('catalog_number', patterns.alt_catalog)):
+            if self._out_of_time(field):
+                break
+            for pattern in field_patterns:
+                match = pattern.search(message_text)
+                if match:
+                    extracted_data[field] = match.group(1)
+                    break
+
+        if not self._out_of_time('link'):
+            url_match = patterns.alt_url.search(message_text)
+            if url_match:
+                extracted_data['link'] = url_match.group(0)
+
+        if not self._out_of_time('date_of_request'):
+            for pattern in patterns.alt_dates:
+                match = pattern.search(message_text)
+                if match:
+                    extracted_data['date_of_request'] = match.group(1)
+                    break
+
+        # Fields after the budget ran out were never looked at
+        if self._stopped_at is not None:
+            extracted_data['confidence'] = 'low'
+
+        return extracted_data
+
+
+_exact = Classifier()
+
+
+def classify(message_text):
+    """Return the parsed purchase request in a message, or None (reference behaviour)."""
+    return _exact.classify(message_text)
+
+
+# Parallel classification: each worker process builds its own Classifier,
+# since the compiled pattern sets (and their prefilter lambdas) don't pickle
+_worker_classifier = None
+
+
+def _init_worker(exact, time_budget):
+    global _worker_classifier
+    patterns = EXACT_PATTERNS if exact else hardened_patterns()
+    _worker_classifier = Classifier(patterns, time_budget=time_budget)
+
+
+def _classify_chunk(chunk):
+    """Classify (text, ref) pairs in a worker; return the results and its slow messages."""
+    results = [_worker_classifier.classify(text, ref) for text, ref in chunk]
+    slow_messages = list(_worker_classifier.slow_messages)
+    _worker_classifier.slow_messages.clear()
+    return results, slow_messages
+
+
+def classify_in_pool(items, workers, exact=False, time_budget=None, chunk_size=None):
+    """Classify (text, ref) pairs in a pool of worker processes.
+
+    items is split into contiguous chunks and the results come back in
+    input order, exactly as a serial loop over Classifier.classify() would
+    return them. Returns (results, slow_messages).
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    items = list(items)
+    if chunk_size is None:
+        # A few chunks per worker evens out chunks that happen to be slow
+        chunk_size = max(500, len(items) // (workers * 4) + 1)
+    chunks = [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+
+    results, slow_messages = [], []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(exact, time_budget)) as pool:
+        for chunk_results, chunk_slow in pool.map(_classify_chunk, chunks):
+            results.extend(chunk_results)
+            slow_messages.extend(chunk_slow)
+    return results, slow_messages
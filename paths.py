@@ -0,0 +1,13 @@
+"""
+Storage locations shared by the bot and the command-line tools.
+
+Importing this module has no side effects, so request_db.py, reporting.py
+and request_archive.py can default to the bot's folders without importing
+slackbot (which starts Slack clients and logging when imported).
+"""
+
+import os
+
+# Base folder for storing requests
+BASE_DIR = "/Users/paul/Desktop/slackbot"
+REQUESTS_FOLDER = os.path.join(BASE_DIR, "purchase_requests")
@@ -0,0 +1,116 @@
+"""
+Raw Slack Page Cache
+
+Every conversations.history page the extractor fetches (with the thread
+replies read for it) is also written here, gzip-compressed, one file per
+page:
+
+    <cache folder>/<channel id>/<oldest ts>_<newest ts>_<fetch id>.jsonl.gz
+
+Files are only ever added, never rewritten, and each is written to a
+temporary name first, so an interrupted run leaves no partial page behind.
+The fetch id orders the pages by the time they were written; when the same
+message was fetched more than once, the latest copy wins.
+
+`extract_historical_requests.py --from-cache` replays the cache through the
+parse and save pipeline without calling Slack, so parser changes can be
+tried on a fixed corpus in seconds.
+
+A fetch that read a channel back to its first message records that
+message's ts in <channel id>/history_start.json. A replay can only stand in
+for the whole channel while the page holding that message is still cached;
+otherwise (pages fetched only by incremental runs, or pruned) it covers part
+of the history and must be merged into the stored months, not replace them.
+"""
+
+import os
+import gzip
+import json
+import time
+
+PAGE_SUFFIX = ".jsonl.gz"
+HISTORY_START_FILE = "history_start.json"
+
+
+def channel_folder(folder, channel_id):
+    """Folder holding the cached pages of one channel."""
+    return os.path.join(folder, channel_id)
+
+
+def list_channels(folder):
+    """Channel IDs that have cached pages."""
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name for name in os.listdir(folder) if os.path.isdir(os.path.join(folder, name)))
+
+
+def append_page(folder, channel_id, messages):
+    """Add one page of raw messages to the cache; return its path (None for an empty page)."""
+    if not messages:
+        return None
+
+    timestamps = [message.get("ts", "0") for message in messages]
+    oldest = min(timestamps, key=float)
+    newest = max(timestamps, key=float)
+    target_folder = channel_folder(folder, channel_id)
+    os.makedirs(target_folder, exist_ok=True)
+    path = os.path.join(target_folder, f"{oldest}_{newest}_{time.time_ns()}{PAGE_SUFFIX}")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for message in messages:
+            f.write(json.dumps(message, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+    return path
+
+
+def page_key(file_name):
+    """(fetch id, oldest ts, newest ts) of a cached page file name."""
+    oldest, newest, fetch_id = file_name[:-len(PAGE_SUFFIX)].split("_")
+    return int(fetch_id), oldest, newest
+
+
+def list_pages(folder, channel_id):
+    """Paths of a channel's cached pages, oldest fetch first."""
+    target_folder = channel_folder(folder, channel_id)
+    if not os.path.isdir(target_folder):
+        return []
+    names = [name for name in os.listdir(target_folder) if name.endswith(PAGE_SUFFIX)]
+    return [os.path.join(target_folder, name) for name in sorted(names, key=page_key)]
+
+
+def mark_history_start(folder, channel_id, oldest_ts):
+    """Record the ts of the channel's first message, read by a fetch that reached it."""
+    target_folder = channel_folder(folder, channel_id)
+    os.makedirs(target_folder, exist_ok=True)
+    path = os.path.join(target_folder, HISTORY_START_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"oldest_ts": oldest_ts}, f)
+    os.replace(tmp_path, path)
+
+
+def covers_full_history(folder, channel_id):
+    """Whether the cached pages still reach back to the channel's first message."""
+    path = os.path.join(channel_folder(folder, channel_id), HISTORY_START_FILE)
+    if not os.path.exists(path):
+        return False
+    with open(path, "r") as f:
+        oldest_ts = float(json.load(f)["oldest_ts"])
+    return any(float(page_key(os.path.basename(page))[1]) <= oldest_ts
+               for page in list_pages(folder, channel_id))
+
+
+def read_page(path):
+    """Messages of one cached page."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_messages(folder, channel_id):
+    """Every cached message of a channel, once each (latest fetch wins), newest first."""
+    messages = {}
+    for path in list_pages(folder, channel_id):
+        for message in read_page(path):
+            messages[message.get("ts", "")] = message
+    return sorted(messages.values(), key=lambda m: float(m.get("ts", "0")), reverse=True)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Order Volume Reports
+
+Totals up purchase requests across every month in the request database
+(slash command and historical), instead of opening the monthly CSVs one by
+one:
+
+    python reporting.py                          # per-month table
+    python reporting.py --by user --top 20
+    python reporting.py --by catalog --since 2024-01 --until 2024-12
+    python reporting.py --by user --csv users.csv
+
+For each month, requests are counted and their quantities summed per
+requester and per catalog number. Quantities are free text ("2", "3 boxes",
+"x10", "two"), so parse_quantity() takes the first number it can read;
+requests whose quantity has no number are counted but add nothing to the
+quantity total, and are reported as unparsed. A submission and the bot's
+channel post of it (read back by the extractor) count as one request; see
+RequestDB.echo_ids.
+
+Month aggregates and their running totals are cached in report_cache.json
+next to the database, with a fingerprint of each month's rows (count,
+highest id, total size). A report only re-reads the months whose
+fingerprint changed, which is usually just the current one, and moves the
+totals by the difference.
+"""
+
+import os
+import re
+import sys
+import csv
+import json
+import argparse
+
+from request_db import RequestDB, DB_FILE_NAME
+from request_store import atomic_write
+from duplicate_index import normalize_catalog
+from paths import REQUESTS_FOLDER
+
+CACHE_FILE_NAME = "report_cache.json"
+CACHE_VERSION = 4
+
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "dozen": 12}
+_NUMBER = re.compile(r'\d+(?:,\d{3})*(?:\.\d+)?|\.\d+')
+_WORD = re.compile(r'[a-z]+')
+
+
+def parse_quantity(text):
+    """First number in a free-form quantity ("3 boxes" -> 3.0, "two" -> 2.0), or None."""
+    text = (text or "").strip().lower()
+    match = _NUMBER.search(text)
+    if match:
+        return float(match.group().replace(",", ""))
+    for word in _WORD.findall(text):
+        if word in NUMBER_WORDS:
+            return float(NUMBER_WORDS[word])
+    return None
+
+
+def aggregate_month(db, month):
+    """Counts and quantities of one month, overall, per requester and per catalog number."""
+    aggregate = {"requests": 0, "quantity": 0.0, "unparsed": 0, "users": {}, "catalogs": {}}
+    # The bot's channel posts repeat slash command submissions; count each request once
+    echoes = db.echo_ids(month=month)
+    for row in db.month_rows(month, "id, user_id, user_name, item_name, quantity, catalog_number"):
+        if row["id"] in echoes:
+            continue
+        quantity = parse_quantity(row["quantity"])
+        aggregate["requests"] += 1
+        aggregate["quantity"] += quantity or 0.0
+        aggregate["unparsed"] += quantity is None
+
+        user_key = row["user_id"] or row["user_name"] or "unknown"
+        user = aggregate["users"].setdefault(user_key, [row["user_name"] or user_key, 0, 0.0])
+        user[1] += 1
+        user[2] += quantity or 0.0
+
+        catalog_key = normalize_catalog(row["catalog_number"])
+        if catalog_key:
+            catalog = aggregate["catalogs"].setdefault(
+                catalog_key, [row["catalog_number"], row["item_name"] or "", 0, 0.0])
+            catalog[2] += 1
+            catalog[3] += quantity or 0.0
+    return aggregate
+
+
+def empty_totals():
+    return {"users": {}, "catalogs": {}}
+
+
+def add_month(totals, aggregate, sign=1):
+    """Add (sign=1) or remove (sign=-1) one month's aggregate from running totals."""
+    users = totals["users"]
+    for user_key, (name, count, quantity) in aggregate["users"].items():
+        total = users.setdefault(user_key, [name, 0, 0.0, 0])
+        total[0] = name if sign > 0 else total[0]
+        total[1] += sign * count
+        total[2] += sign * quantity
+        total[3] += sign
+        if total[3] <= 0:
+            del users[user_key]
+    catalogs = totals["catalogs"]
+    for catalog_key, (catalog_number, item_name, count, quantity) in aggregate["catalogs"].items():
+        total = catalogs.setdefault(catalog_key, [catalog_number, item_name, 0, 0.0, 0])
+        total[2] += sign * count
+        total[3] += sign * quantity
+        total[4] += sign
+        if total[4] <= 0:
+            del catalogs[catalog_key]
+
+
+def merged_totals(months):
+    """Per-requester and per-catalog totals of the given (month, aggregate) pairs."""
+    totals = empty_totals()
+    for _, aggregate in months:
+        add_month(totals, aggregate)
+    return totals
+
+
+class ReportCache:
+    """Per-month aggregates of a request database, refreshed only for months that changed.
+
+    totals holds the sum of every month's aggregate. When a month changes,
+    its old aggregate is subtracted and the new one added, so the other
+    months are never re-read or re-merged.
+    """
+
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+        self.months = {}  # month -> {"fingerprint": [...], "aggregate": {...}}
+        self.totals = empty_totals()
+        self.recomputed = []
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                if data.get("version") == CACHE_VERSION:
+                    self.months = data["months"]
+                    self.totals = data["totals"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️  Ignoring unreadable report cache {path}: {e}")
+
+    def clear(self):
+        """Forget every cached aggregate."""
+        self.months = {}
+        self.totals = empty_totals()
+
+    def refresh(self):
+        """Re-aggregate months whose rows changed and drop months that are gone; return True if anything changed."""
+        fingerprints = self.db.month_stats()
+        self.recomputed = [month for month, fingerprint in sorted(fingerprints.items())
+                           if self.months.get(month, {}).get("fingerprint") != fingerprint]
+        removed = [month for month in self.months if month not in fingerprints]
+        for month in self.recomputed + removed:
+            if month in self.months:
+                add_month(self.totals, self.months.pop(month)["aggregate"], sign=-1)
+        for month in self.recomputed:
+            aggregate = aggregate_month(self.db, month)
+            self.months[month] = {"fingerprint": fingerprints[month], "aggregate": aggregate}
+            add_month(self.totals, aggregate)
+        return bool(self.recomputed or removed)
+
+    def save(self):
+        """Write the month aggregates and totals to the cache file."""
+        with atomic_write(self.path) as f:
+            json.dump({"version": CACHE_VERSION, "months": self.months, "totals": self.totals}, f)
+
+    def selected(self, since=None, until=None):
+        """(month, aggregate) pairs between since and until (YYYY-MM, inclusive), oldest first."""
+        return [(month, entry["aggregate"]) for month, entry in sorted(self.months.items())
+                if (not since or month >= since) and (not until or month <= until)]
+
+
+def by_month(months, totals):
+    """Report rows per month: month, requests, quantity, unparsed quantities, requesters."""
+    return [[month, a["requests"], a["quantity"], a["unparsed"], len(a["users"])] for month, a in months]
+
+
+def by_user(months, totals):
+    """Report rows per requester, most requests first."""
+    rows = [[name, user_key, count, quantity, active]
+            for user_key, (name, count, quantity, active) in totals["users"].items()]
+    return sorted(rows, key=lambda row: (-row[2], row[0]))
+
+
+def by_catalog(months, totals):
+    """Report rows per catalog number, most requests first."""
+    return sorted((list(total) for total in totals["catalogs"].values()), key=lambda row: (-row[2], row[0]))
+
+
+REPORTS = {
+    "month": (by_month, ["month", "requests", "quantity", "unparsed_quantities", "requesters"]),
+    "user": (by_user, ["requester", "user_id", "requests", "quantity", "months_active"]),
+    "catalog": (by_catalog, ["catalog_number", "item_name", "requests", "quantity", "months_ordered"]),
+}
+
+
+def format_value(value):
+    """Table cell text; whole quantities are shown without decimals."""
+    if isinstance(value, float):
+        return f"{value:,.0f}" if value.is_integer() else f"{value:,.2f}"
+    return str(value)
+
+
+def print_table(header, rows):
+    """Print rows as aligned columns under header."""
+    cells = [header] + [[format_value(value) for value in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(header))]
+    for position, row in enumerate(cells):
+        print("   " + "  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+        if position == 0:
+            print("   " + "  ".join("-" * width for width in widths))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report request counts and quantities across months.")
+    parser.add_argument("--folder", help="requests folder (defaults to REQUESTS_FOLDER in paths.py)")
+    parser.add_argument("--by", choices=sorted(REPORTS), default="month")
+    parser.add_argument("--since", help="first month to include (YYYY-MM)")
+    parser.add_argument("--until", help="last month to include (YYYY-MM)")
+    parser.add_argument("--top", type=int, help="only show the first N rows")
+    parser.add_argument("--csv", help="also write the report to this CSV file")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the cached month aggregates")
+    args = parser.parse_args()
+
+    folder = args.folder or REQUESTS_FOLDER
+
+    db = RequestDB(os.path.join(folder, DB_FILE_NAME))
+    cache = ReportCache(db, os.path.join(folder, CACHE_FILE_NAME))
+    if args.rebuild:
+        cache.clear()
+    if cache.refresh():
+        cache.save()
+
+    months = cache.selected(args.since, args.until)
+    if not months:
+        print(f"❌ No requests found in {db.path}")
+        return 1
+
+    # The cached totals cover every month; a narrower range is merged from its months
+    totals = cache.totals if not (args.since or args.until) else merged_totals(months)
+    build, header = REPORTS[args.by]
+    rows = build(months, totals)
+    total_requests = sum(a["requests"] for _, a in months)
+    total_unparsed = sum(a["unparsed"] for _, a in months)
+    print(f"📊 {total_requests:,} requests in {len(months)} months ({months[0][0]} to {months[-1][0]}), "
+          f"{len(cache.recomputed)} months re-read")
+    if total_unparsed:
+        print(f"   {total_unparsed:,} quantities had no number and count as 0")
+    print()
+    print_table(header, rows[:args.top] if args.top else rows)
+
+    if args.csv:
+        with atomic_write(args.csv, newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        print(f"\n✅ Saved {len(rows)} rows to {args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
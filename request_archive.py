@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Columnar archive of historical purchase requests.
+
+The monthly historical JSON and CSV files repeat every key and requester
+name on every row, and each reader has to parse them as text. An archive
+holds a whole year of extracted requests in one binary file laid out by
+column, historical_requests_YYYY.reqarc, which can be memory-mapped:
+
+    python request_archive.py build                # every year in the database
+    python request_archive.py build --year 2024
+    python request_archive.py info historical/archive/historical_requests_2024.reqarc
+
+The extractor also rebuilds the archive of each year it saves when run
+with --archive.
+
+File layout (all sections 8-byte aligned, integers in the byte order named
+in the header):
+
+    b"REQARCH1" | uint64 header size | JSON header | column sections
+
+- slack_timestamp is an int64 array of microseconds (-1 when missing).
+- requester_name, original_user_id, format_type and confidence are
+  dictionary-encoded: an array of uint16/uint32 codes plus the distinct
+  values.
+- The other fields are string columns: uint32 end offsets into a UTF-8 blob.
+- A column that some requests don't have (or have as null) also gets a
+  uint8 state per row (0 value, 1 no such key, 2 null). Such rows read as
+  "" (-1 for timestamps) from the column, and records() leaves the key out
+  or sets it to None, so the rebuilt dicts equal the saved ones.
+
+RequestArchive maps the file and returns columns on demand. Timestamp and
+code arrays are memoryviews straight into the mapping, so reading one column
+doesn't touch the bytes of the others.
+"""
+
+import os
+import sys
+import json
+import mmap
+import argparse
+from array import array
+
+from request_db import RequestDB, DB_FILE_NAME, SOURCE_HISTORICAL, historical_paths
+from request_store import atomic_write
+from paths import REQUESTS_FOLDER
+
+MAGIC = b"REQARCH1"
+FORMAT_VERSION = 2
+ARCHIVE_FOLDER_NAME = "archive"
+ARCHIVE_SUFFIX = ".reqarc"
+
+TIMESTAMP_COLUMN = "slack_timestamp"
+DICTIONARY_COLUMNS = ["requester_name", "original_user_id", "format_type", "confidence"]
+STRING_COLUMNS = ["item_name", "quantity", "catalog_number", "link", "date_of_request", "extracted_date",
+                  "message_text"]
+# Per-row states of a column with missing values
+STATE_VALUE, STATE_ABSENT, STATE_NULL = 0, 1, 2
+COLUMNS = [TIMESTAMP_COLUMN] + DICTIONARY_COLUMNS + STRING_COLUMNS
+
+
+def archive_path(folder, year):
+    """Path of a year's archive in folder."""
+    return os.path.join(folder, f"historical_requests_{year}{ARCHIVE_SUFFIX}")
+
+
+def timestamp_to_micros(slack_ts):
+    """Slack timestamp string ("1704067200.123456") as integer microseconds, -1 if missing."""
+    if not slack_ts:
+        return -1
+    seconds, _, fraction = str(slack_ts).partition(".")
+    return int(seconds) * 1_000_000 + int((fraction + "000000")[:6])
+
+
+def micros_to_timestamp(micros):
+    """Inverse of timestamp_to_micros ("" for -1)."""
+    if micros < 0:
+        return ""
+    return f"{micros // 1_000_000}.{micros % 1_000_000:06d}"
+
+
+def _string_section(values):
+    """(uint32 end offsets, UTF-8 blob) of a list of strings."""
+    encoded = [value.encode("utf-8") for value in values]
+    ends = array("I")
+    total = 0
+    for item in encoded:
+        total += len(item)
+        ends.append(total)
+    return ends, b"".join(encoded)
+
+
+class _SectionWriter:
+    """Collects 8-byte aligned sections and their offsets."""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def add(self, data):
+        data = data.tobytes() if isinstance(data, array) else data
+        offset = self.size
+        padding = -len(data) % 8
+        self.parts.append(data + b"\0" * padding)
+        self.size += len(data) + padding
+        return offset
+
+
+def _value_states(requests, name):
+    """uint8 state of each request's value for name, or None when every request has one."""
+    states = array("B", (STATE_VALUE if req.get(name) is not None else STATE_ABSENT if name not in req
+                         else STATE_NULL for req in requests))
+    return states if any(states) else None
+
+
+def write_archive(path, requests):
+    """Write requests (sorted by slack_timestamp) to a columnar archive; return the row count."""
+    requests = sorted(requests, key=lambda req: timestamp_to_micros(req.get(TIMESTAMP_COLUMN)))
+    sections = _SectionWriter()
+    columns = {}
+
+    timestamps = array("q", (timestamp_to_micros(req.get(TIMESTAMP_COLUMN)) for req in requests))
+    columns[TIMESTAMP_COLUMN] = {"kind": "timestamp", "offset": sections.add(timestamps)}
+
+    for name in DICTIONARY_COLUMNS:
+        codes_by_value = {}
+        values = [str(req.get(name) or "") for req in requests]
+        for value in values:
+            codes_by_value.setdefault(value, len(codes_by_value))
+        typecode = "H" if len(codes_by_value) <= 0xFFFF else "I"
+        codes = array(typecode, (codes_by_value[value] for value in values))
+        ends, blob = _string_section(list(codes_by_value))
+        columns[name] = {"kind": "dictionary", "typecode": typecode, "codes": sections.add(codes),
+                         "count": len(codes_by_value), "ends": sections.add(ends),
+                         "blob": sections.add(blob), "blob_size": len(blob)}
+
+    for name in STRING_COLUMNS:
+        ends, blob = _string_section([str(req.get(name) or "") for req in requests])
+        columns[name] = {"kind": "string", "ends": sections.add(ends), "blob": sections.add(blob),
+                         "blob_size": len(blob)}
+
+    for name in COLUMNS:
+        states = _value_states(requests, name)
+        if states is not None:
+            columns[name]["states"] = sections.add(states)
+
+    header = {"version": FORMAT_VERSION, "rows": len(requests), "byteorder": sys.byteorder, "columns": columns}
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with atomic_write(path, mode="wb") as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for part in sections.parts:
+            f.write(part)
+    return len(requests)
+
+
+class DictionaryColumn:
+    """Dictionary-encoded column: codes (zero-copy memoryview) and the distinct values."""
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    def __iter__(self):
+        values = self.values
+        return (values[code] for code in self.codes)
+
+    def counts(self):
+        """{value: rows} without decoding each row."""
+        totals = [0] * len(self.values)
+        for code in self.codes:
+            totals[code] += 1
+        return {value: total for value, total in zip(self.values, totals) if total}
+
+
+class StringColumn:
+    """Variable-length strings decoded from the mapped blob on access."""
+
+    def __init__(self, ends, blob):
+        self.ends = ends
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getitem__(self, row):
+        start = self.ends[row - 1] if row else 0
+        return str(self.blob[start:self.ends[row]], "utf-8")
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self.ends)))
+
+
+class RequestArchive:
+    """Read-only, memory-mapped view of one archive file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if bytes(self._view[:len(MAGIC)]) != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a request archive")
+        header_size = int.from_bytes(self._view[8:16], "little")
+        self.header = json.loads(bytes(self._view[16:16 + header_size]))
+        if self.header.get("version") != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} has unsupported archive version {self.header.get('version')}; "
+                             f"rebuild it with `python request_archive.py build`")
+        self._data_start = 16 + header_size
+        self.rows = self.header["rows"]
+        self._columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _array(self, offset, typecode, count):
+        itemsize = array(typecode).itemsize
+        start = self._data_start + offset
+        view = self._view[start:start + itemsize * count]
+        if self.header["byteorder"] == sys.byteorder:
+            return view.cast(typecode)
+        # Written on a machine with the other byte order: copy once and swap
+        swapped = array(typecode, bytes(view))
+        swapped.byteswap()
+        return memoryview(swapped)
+
+    def _blob(self, offset, size):
+        start = self._data_start + offset
+        return self._view[start:start + size]
+
+    def column(self, name):
+        """One column: a memoryview of int64 microseconds, a DictionaryColumn or a StringColumn."""
+        if name in self._columns:
+            return self._columns[name]
+        spec = self.header["columns"].get(name)
+        if spec is None:
+            raise KeyError(f"{self.path} has no column {name!r}")
+        if spec["kind"] == "timestamp":
+            column = self._array(spec["offset"], "q", self.rows)
+        elif spec["kind"] == "dictionary":
+            values = StringColumn(self._array(spec["ends"], "I", spec["count"]),
+                                  self._blob(spec["blob"], spec["blob_size"]))
+            column = DictionaryColumn(self._array(spec["codes"], spec["typecode"], self.rows), list(values))
+        else:
+            column = StringColumn(self._array(spec["ends"], "I", self.rows),
+                                  self._blob(spec["blob"], spec["blob_size"]))
+        self._columns[name] = column
+        return column
+
+    def states(self, name):
+        """uint8 state of each row's value of a column (see STATE_*), or None when every row has one."""
+        spec = self.header["columns"].get(name)
+        if spec is None:
+            raise KeyError(f"{self.path} has no column {name!r}")
+        return self._array(spec["states"], "B", self.rows) if "states" in spec else None
+
+    def records(self, columns=None):
+        """Yield each request as the dict it was saved as (of the given columns only), oldest first."""
+        names = columns or COLUMNS
+        loaded = [(name, self.column(name), self.states(name)) for name in names]
+        for row in range(self.rows):
+            record = {}
+            for name, column, states in loaded:
+                state = states[row] if states is not None else STATE_VALUE
+                if state == STATE_ABSENT:
+                    continue
+                if state == STATE_NULL:
+                    record[name] = None
+                elif name == TIMESTAMP_COLUMN:
+                    record[name] = micros_to_timestamp(column[row])
+                else:
+                    record[name] = column[row]
+            yield record
+
+    def close(self):
+        """Release the mapping (deferred to garbage collection while columns are still referenced)."""
+        self._columns = {}
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+
+
+def build_archives(db, archive_folder, years=None):
+    """Rebuild the archives of the given years (default: every year) from the database; return {year: rows}."""
+    months_by_year = {}
+    for month in db.months(SOURCE_HISTORICAL):
+        months_by_year.setdefault(month[:4], []).append(month)
+    built = {}
+    for year in sorted(years or months_by_year):
+        requests = [req for month in months_by_year.get(year, []) for req in db.month_records(month, SOURCE_HISTORICAL)]
+        if requests:
+            built[year] = write_archive(archive_path(archive_folder, year), requests)
+    return built
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect columnar archives of historical requests.")
+    parser.add_argument("--folder", help="requests folder (defaults to REQUESTS_FOLDER in paths.py)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="rebuild yearly archives from the request database")
+    build.add_argument("--year", action="append", help="only this year (repeatable)")
+    info = subparsers.add_parser("info", help="describe archive files")
+    info.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        for path in args.paths:
+            with RequestArchive(path) as archive:
+                year = os.path.basename(path)[len("historical_requests_"):-len(ARCHIVE_SUFFIX)]
+                folder = os.path.dirname(os.path.dirname(os.path.abspath(path)))
+                text_size = 0
+                for month in range(1, 13):
+                    for text_file in historical_paths(folder, f"{year}-{month:02d}"):
+                        text_size += os.path.getsize(text_file) if os.path.exists(text_file) else 0
+                size = os.path.getsize(path)
+                print(f"📦 {path}: {archive.rows:,} requests, {size / 1024:,.0f} KiB")
+                if text_size:
+                    print(f"   monthly JSON + CSV: {text_size / 1024:,.0f} KiB (archive is {size / text_size:.0%} of that)")
+                for name in DICTIONARY_COLUMNS:
+                    print(f"   {name}: {len(archive.column(name).values)} distinct values")
+        return 0
+
+    folder = args.folder or REQUESTS_FOLDER
+    db = RequestDB(os.path.join(folder, DB_FILE_NAME))
+    archive_folder = os.path.join(folder, "historical", ARCHIVE_FOLDER_NAME)
+    built = build_archives(db, archive_folder, args.year)
+    if not built:
+        print(f"❌ No historical requests found in {db.path}")
+        return 1
+    for year, rows in built.items():
+        print(f"✅ Archived {rows:,} requests for {year}: {archive_path(archive_folder, year)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
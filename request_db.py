@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+SQLite store for purchase requests.
+
+Slash command submissions (slackbot.py) and extracted historical requests
+(extract_historical_requests.py) are both written to one SQLite database,
+purchase_requests.db in the requests folder. It runs in WAL mode, so readers
+never block the bot's writes, and it is indexed on timestamp, user ID,
+catalog number and month, so questions such as "all orders of catalog X"
+no longer mean parsing every monthly file.
+
+The monthly JSON and CSV files are exports of the database:
+
+    python request_db.py import                        # load existing JSON/journal files once
+    python request_db.py export                        # rewrite every month's JSON/CSV
+    python request_db.py export --month 2025-01
+    python request_db.py query --catalog AB-123
+    python request_db.py query --user U012345 --since 2025-01-01
+
+Each row keeps the request exactly as it was saved (the `record` column),
+plus the indexed columns. Historical requests are keyed by their Slack
+timestamp, so re-running the extractor updates rows instead of adding
+duplicates. Bulk imports are written in batched transactions.
+
+Legacy slash command files are imported once per month (recorded in the
+imported_months table), skipping records the database already holds, so
+months the bot wrote to before the import keep both. The bot and `export`
+import any month not imported yet before writing, so an export never
+overwrites the only copy of a legacy month.
+"""
+
+import os
+import sys
+import csv
+import json
+import glob
+import time
+import sqlite3
+import argparse
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+import request_store
+from request_store import atomic_write
+from paths import REQUESTS_FOLDER
+
+DB_FILE_NAME = "purchase_requests.db"
+SOURCE_SLASH = "slash_command"
+SOURCE_HISTORICAL = "historical"
+IMPORT_BATCH_SIZE = 1000
+BUSY_TIMEOUT_MS = 5000
+
+# The extractor reads the bot's own channel posts back as current_bot requests. A post lands
+# seconds after its slash command, or minutes later when it was queued for the dispatcher.
+ECHO_FORMAT = "current_bot"
+ECHO_WINDOW_SECONDS = 15 * 60
+
+HISTORICAL_PREFIX = "historical_requests"
+HISTORICAL_CSV_FIELDS = ["requester_name", "item_name", "quantity", "catalog_number", "link", "date_of_request",
+                         "slack_timestamp", "format_type", "confidence", "extracted_date", "original_user_id"]
+HISTORICAL_CSV_DEFAULTS = {"requester_name": "Unknown", "confidence": "high"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    month TEXT NOT NULL,
+    ts REAL NOT NULL,
+    slack_ts TEXT,
+    user_id TEXT,
+    user_name TEXT,
+    item_name TEXT,
+    quantity TEXT,
+    catalog_number TEXT,
+    record TEXT NOT NULL,
+    UNIQUE (source, slack_ts)
+);
+CREATE INDEX IF NOT EXISTS idx_requests_ts ON requests (ts);
+CREATE INDEX IF NOT EXISTS idx_requests_user ON requests (user_id, ts);
+CREATE INDEX IF NOT EXISTS idx_requests_catalog ON requests (catalog_number COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_requests_month ON requests (source, month, ts);
+CREATE TABLE IF NOT EXISTS revisions (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imported_months (
+    month TEXT PRIMARY KEY,
+    records INTEGER NOT NULL,
+    imported_at REAL NOT NULL
+);
+"""
+
+
+def _canonical(record):
+    """Key under which two records with the same content compare equal."""
+    return json.dumps(record, sort_keys=True)
+
+
+def echo_key(item_name, quantity, catalog_number):
+    """Fields a bot post repeats from its slash command, normalized for comparison."""
+    return tuple(" ".join((value or "").lower().split()) for value in (item_name, quantity, catalog_number))
+
+
+class RequestDB:
+    """Thread-safe handle on the requests database (one connection per thread)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Autocommit; transactions are opened explicitly with BEGIN
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed writes as one transaction, holding the write lock from the start."""
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _insert(self, connection, source, month, record, ts, slack_ts=None, user_id=None, user_name=None):
+        connection.execute(
+            """INSERT INTO requests (source, month, ts, slack_ts, user_id, user_name,
+                                     item_name, quantity, catalog_number, record)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (source, slack_ts) DO UPDATE SET
+                   month = excluded.month, ts = excluded.ts, user_id = excluded.user_id,
+                   user_name = excluded.user_name, item_name = excluded.item_name,
+                   quantity = excluded.quantity, catalog_number = excluded.catalog_number,
+                   record = excluded.record""",
+            (source, month, ts, slack_ts, user_id, user_name, record.get("item_name"),
+             record.get("quantity"), record.get("catalog_number"), json.dumps(record)))
+
+    def add_request(self, record, user_id=None, user_name=None, month=None, submitted_at=None):
+        """Store one slash command submission and commit it."""
+        submitted_at = submitted_at or time.time()
+        month = month or datetime.fromtimestamp(submitted_at).strftime("%Y-%m")
+        with self.transaction() as connection:
+            # A NULL user_id marks requests imported from monthly files (see echo_ids)
+            self._insert(connection, SOURCE_SLASH, month, record, submitted_at,
+                         user_id=user_id or "", user_name=user_name)
+
+    def import_historical(self, month, requests, replace=False):
+        """Upsert extracted requests of a month by Slack timestamp, IMPORT_BATCH_SIZE per transaction.
+
+        With replace=True the month's earlier historical rows are dropped first
+        (in the same transaction as the first batch). Upserts change rows in
+        place, so each import bumps historical_revision().
+        """
+        for start in range(0, max(len(requests), 1), IMPORT_BATCH_SIZE):
+            with self.transaction() as connection:
+                if start == 0:
+                    connection.execute(
+                        "INSERT INTO revisions (name, value) VALUES (?, 1) "
+                        "ON CONFLICT (name) DO UPDATE SET value = value + 1", (SOURCE_HISTORICAL,))
+                if replace and start == 0:
+                    connection.execute("DELETE FROM requests WHERE source = ? AND month = ?",
+                                       (SOURCE_HISTORICAL, month))
+                for record in requests[start:start + IMPORT_BATCH_SIZE]:
+                    slack_ts = record.get("slack_timestamp") or None
+                    self._insert(connection, SOURCE_HISTORICAL, month, record, float(slack_ts or 0),
+                                 slack_ts=slack_ts, user_id=record.get("original_user_id"),
+                                 user_name=record.get("requester_name"))
+        return len(requests)
+
+    def historical_revision(self):
+        """Number of historical imports so far; rows kept in memory are stale once it changes."""
+        row = self._connect().execute("SELECT value FROM revisions WHERE name = ?", (SOURCE_HISTORICAL,)).fetchone()
+        return row[0] if row else 0
+
+    def imported_months(self):
+        """Months whose legacy slash command file has been imported."""
+        return {row["month"] for row in self._connect().execute("SELECT month FROM imported_months")}
+
+    def import_slash_month(self, month, records):
+        """Add a month of legacy slash command records (from JSON views or journals) in one transaction.
+
+        Each month is imported once. Records already stored for the month
+        (submitted before the import, or from an earlier import) are matched
+        by content and skipped. Returns the number of records added.
+        """
+        # Legacy records carry no submission time; keep their order within the month
+        month_start = datetime.strptime(month, "%Y-%m").timestamp()
+        added = 0
+        with self.transaction() as connection:
+            if connection.execute("SELECT 1 FROM imported_months WHERE month = ?", (month,)).fetchone():
+                return 0
+            stored = Counter(_canonical(json.loads(row["record"])) for row in connection.execute(
+                "SELECT record FROM requests WHERE source = ? AND month = ?", (SOURCE_SLASH, month)))
+            for position, record in enumerate(records):
+                key = _canonical(record)
+                if stored[key]:
+                    stored[key] -= 1
+                    continue
+                self._insert(connection, SOURCE_SLASH, month, record, month_start + position * 1e-3)
+                added += 1
+            connection.execute("INSERT INTO imported_months (month, records, imported_at) VALUES (?, ?, ?)",
+                               (month, len(records), time.time()))
+        return added
+
+    def month_records(self, month, source=SOURCE_SLASH):
+        """The saved records of a month, oldest first."""
+        rows = self._connect().execute(
+            "SELECT record FROM requests WHERE source = ? AND month = ? ORDER BY ts, id", (source, month))
+        return [json.loads(row["record"]) for row in rows]
+
+    def months(self, source=SOURCE_SLASH):
+        """Month keys that have requests from source."""
+        rows = self._connect().execute("SELECT DISTINCT month FROM requests WHERE source = ? ORDER BY month",
+                                       (source,))
+        return [row["month"] for row in rows]
+
+    def find(self, catalog_number=None, user_id=None, since=None, until=None, month=None, source=None,
+             limit=None):
+        """Rows matching every given filter, newest first; since/until are Unix timestamps."""
+        conditions, params = [], []
+        for column, value in (("catalog_number = ? COLLATE NOCASE", catalog_number), ("user_id = ?", user_id),
+                              ("ts >= ?", since), ("ts < ?", until), ("month = ?", month),
+                              ("source = ?", source)):
+            if value is not None:
+                conditions.append(column)
+                params.append(value)
+        query = "SELECT * FROM requests"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY ts DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self._connect().execute(query, params)]
+
+    def stats(self):
+        """(row count, highest row id) of the requests table."""
+        row = self._connect().execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM requests").fetchone()
+        return row[0], row[1]
+
+    def month_stats(self):
+        """{month: [row count, highest id, total record size]} over both sources."""
+        rows = self._connect().execute(
+            "SELECT month, COUNT(*), MAX(id), TOTAL(LENGTH(record)) FROM requests GROUP BY month")
+        return {row[0]: [row[1], row[2], int(row[3])] for row in rows}
+
+    def month_rows(self, month, columns="*"):
+        """Rows of a month from both sources, in id order."""
+        return self._connect().execute(f"SELECT {columns} FROM requests WHERE month = ? ORDER BY id", (month,))
+
+    def _echo_posts(self, conditions, params):
+        """Historical current_bot rows matching the SQL conditions, oldest first."""
+        conditions = ["source = ?", "record LIKE ?"] + conditions
+        params = [SOURCE_HISTORICAL, f"%{ECHO_FORMAT}%"] + params
+        return [row for row in self._connect().execute(
+            f"SELECT id, month, ts, item_name, quantity, catalog_number, record FROM requests "
+            f"WHERE {' AND '.join(conditions)} ORDER BY ts", params)
+            if json.loads(row["record"]).get("format_type") == ECHO_FORMAT]
+
+    def echo_ids(self, month=None, since=None, after_id=None):
+        """Ids of historical current_bot rows that repeat a stored slash command submission.
+
+        Every request submitted through the bot is stored as a slash command
+        row and, once the extractor reads the channel, as the bot's post. A
+        post repeats the item, quantity and catalog number but can't always be
+        attributed to its requester, so it is matched on those fields: each
+        submission pairs with the nearest such post within ECHO_WINDOW_SECONDS.
+        Submissions imported from monthly files (stored without a user and at
+        made-up times) pair with any such post of their month instead.
+
+        month, since (a Unix timestamp) and after_id limit the posts returned.
+        Pairs are always worked out over whole months, so every caller agrees
+        on which posts are echoes.
+        """
+        conditions, params = [], []
+        for column, value in (("month = ?", month), ("ts >= ?", since), ("id > ?", after_id)):
+            if value is not None:
+                conditions.append(column)
+                params.append(value)
+        wanted = self._echo_posts(conditions, params)
+        if not wanted:
+            return set()
+        months = sorted({row["month"] for row in wanted})
+        month_filter = f"month IN ({','.join('?' * len(months))})"
+        posts = wanted if conditions == ["month = ?"] else self._echo_posts([month_filter], months)
+
+        connection = self._connect()
+        submissions = {}
+        for row in connection.execute(
+                "SELECT ts, item_name, quantity, catalog_number FROM requests "
+                "WHERE source = ? AND user_id IS NOT NULL AND ts BETWEEN ? AND ?",
+                (SOURCE_SLASH, posts[0]["ts"] - ECHO_WINDOW_SECONDS, posts[-1]["ts"] + ECHO_WINDOW_SECONDS)):
+            key = echo_key(row["item_name"], row["quantity"], row["catalog_number"])
+            submissions.setdefault(key, []).append(row["ts"])
+        legacy = Counter(
+            (row["month"], echo_key(row["item_name"], row["quantity"], row["catalog_number"]))
+            for row in connection.execute(
+                f"SELECT month, item_name, quantity, catalog_number FROM requests "
+                f"WHERE source = ? AND user_id IS NULL AND {month_filter}", [SOURCE_SLASH] + months))
+
+        echoes = set()
+        unpaired = []
+        for post in posts:
+            key = echo_key(post["item_name"], post["quantity"], post["catalog_number"])
+            times = submissions.get(key)
+            if times:
+                nearest = min(range(len(times)), key=lambda i: abs(times[i] - post["ts"]))
+                if abs(times[nearest] - post["ts"]) <= ECHO_WINDOW_SECONDS:
+                    del times[nearest]
+                    echoes.add(post["id"])
+                    continue
+            unpaired.append((post, key))
+        for post, key in unpaired:
+            if legacy[(post["month"], key)]:
+                legacy[(post["month"], key)] -= 1
+                echoes.add(post["id"])
+        return echoes & {row["id"] for row in wanted}
+
+    def max_id(self):
+        """Highest row id of the requests table (0 when empty)."""
+        return self._connect().execute("SELECT COALESCE(MAX(id), 0) FROM requests").fetchone()[0]
+
+    def rows_after(self, row_id, columns="*"):
+        """Rows with an id above row_id, in id order."""
+        return self._connect().execute(f"SELECT {columns} FROM requests WHERE id > ? ORDER BY id", (row_id,))
+
+    def rows_by_id(self, row_ids):
+        """Rows with the given ids, in the order given (missing ids are skipped)."""
+        if not row_ids:
+            return []
+        placeholders = ",".join("?" * len(row_ids))
+        rows = {row["id"]: dict(row) for row in self._connect().execute(
+            f"SELECT * FROM requests WHERE id IN ({placeholders})", list(row_ids))}
+        return [rows[row_id] for row_id in row_ids if row_id in rows]
+
+
+def historical_paths(folder, month):
+    """Return the JSON and CSV export paths of a historical month."""
+    base = os.path.join(folder, f"{HISTORICAL_PREFIX}_{month}")
+    return base + ".json", base + ".csv"
+
+
+def write_historical_views(folder, month, requests):
+    """Atomically write the JSON and CSV exports of a historical month."""
+    json_file, csv_file = historical_paths(folder, month)
+
+    with atomic_write(json_file) as f:
+        json.dump(requests, f, indent=2)
+
+    with atomic_write(csv_file, newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HISTORICAL_CSV_FIELDS)
+        for req in requests:
+            writer.writerow([req.get(field, HISTORICAL_CSV_DEFAULTS.get(field, "")) for field in HISTORICAL_CSV_FIELDS])
+    return json_file, csv_file
+
+
+def import_slash_files(db, requests_folder, months=None):
+    """Import the legacy slash command files of months not imported yet; return the records added."""
+    imported = db.imported_months()
+    added = 0
+    for month in months or request_store.list_months(requests_folder):
+        if month not in imported:
+            added += db.import_slash_month(month, request_store.load_month(requests_folder, month))
+    return added
+
+
+def export_month(db, month, requests_folder, historical_folder):
+    """Rewrite a month's JSON/CSV exports from the database; return (slash, historical) counts.
+
+    A legacy slash command file that was never imported is imported first,
+    so exporting can't overwrite the only copy of its requests.
+    """
+    import_slash_files(db, requests_folder, [month])
+    slash_records = db.month_records(month, SOURCE_SLASH)
+    if slash_records:
+        request_store.write_views(requests_folder, month, slash_records)
+    historical_records = db.month_records(month, SOURCE_HISTORICAL)
+    if historical_records:
+        write_historical_views(historical_folder, month, historical_records)
+    return len(slash_records), len(historical_records)
+
+
+def import_files(db, requests_folder, historical_folder):
+    """Load the existing monthly files into the database; return (slash, historical) counts.
+
+    Each slash command month is imported once (see import_slash_month), so
+    files exported from the database are not added again. Historical
+    requests are upserted.
+    """
+    slash_count = import_slash_files(db, requests_folder)
+
+    historical_count = 0
+    for path in sorted(glob.glob(os.path.join(historical_folder, f"{HISTORICAL_PREFIX}_*.json"))):
+        month = os.path.basename(path)[len(HISTORICAL_PREFIX) + 1:-len(".json")]
+        with open(path, 'r') as f:
+            historical_count += db.import_historical(month, json.load(f))
+    return slash_count, historical_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the purchase request database.")
+    parser.add_argument("--folder", help="requests folder (defaults to REQUESTS_FOLDER in paths.py)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("import", help="load the existing monthly JSON/journal files")
+    export = subparsers.add_parser("export", help="rewrite the monthly JSON/CSV files from the database")
+    export.add_argument("--month", help="only export this month (YYYY-MM)")
+    query = subparsers.add_parser("query", help="list matching requests, newest first")
+    query.add_argument("--catalog", help="catalog number (case-insensitive)")
+    query.add_argument("--user", help="Slack user ID of the requester")
+    query.add_argument("--since", help="first day to include (YYYY-MM-DD)")
+    query.add_argument("--month", help="month (YYYY-MM)")
+    query.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    folder = args.folder or REQUESTS_FOLDER
+    historical_folder = os.path.join(folder, "historical")
+    db = RequestDB(os.path.join(folder, DB_FILE_NAME))
+
+    if args.command == "import":
+        slash_count, historical_count = import_files(db, folder, historical_folder)
+        print(f"✅ Imported {slash_count} slash command and {historical_count} historical requests into {db.path}")
+    elif args.command == "export":
+        import_slash_files(db, folder)
+        months = [args.month] if args.month else sorted(set(db.months(SOURCE_SLASH)) | set(db.months(SOURCE_HISTORICAL)))
+        for month in months:
+            slash_count, historical_count = export_month(db, month, folder, historical_folder)
+            print(f"✅ Exported {month}: {slash_count} slash command, {historical_count} historical requests")
+    else:
+        since = datetime.strptime(args.since, "%Y-%m-%d").timestamp() if args.since else None
+        rows = db.find(catalog_number=args.catalog, user_id=args.user, since=since, month=args.month,
+                       limit=args.limit)
+        for row in rows:
+            when = datetime.fromtimestamp(row["ts"]).strftime("%Y-%m-%d %H:%M")
+            print(f"{when}  {row['user_name'] or row['user_id'] or 'unknown':<20} {row['item_name']} "
+                  f"x {row['quantity']}  [{row['catalog_number']}]  ({row['source']})")
+        print(f"📊 {len(rows)} requests")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
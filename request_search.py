@@ -0,0 +1,164 @@
+"""
+Search over stored purchase requests.
+
+RequestSearchIndex keeps an in-memory inverted index from the words of each
+request's item name and catalog number to the request's database row, for
+both slash command and historical requests. It is built once from the
+request database and then brought up to date incrementally: before each
+search it reads only the rows added since the last one (by any process,
+including the extractor). After each extractor save, which can change
+rows in place (see RequestDB.historical_revision), the index is rebuilt. The bot's channel posts
+of slash command submissions, read back by the extractor, are left out, so
+each request is found once (see RequestDB.echo_ids).
+
+Words are normalized like the extractor's item matching (lowercase, letters
+and digits only), so "AB-123" finds catalog number "ab123". Every word of a
+query must match, and each word also matches as a prefix ("pip" finds
+"pipette"). Results are newest first and paged; only the rows of the
+requested page are read from the database.
+"""
+
+import json
+import time
+import heapq
+import threading
+from bisect import bisect_left
+from datetime import datetime
+
+from requester_index import normalize_item
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def tokenize(text):
+    """Normalized words of an item name, catalog number or query."""
+    return normalize_item(text).split()
+
+
+class RequestSearchIndex:
+    """Inverted index of item name and catalog number words over a RequestDB."""
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+        self.revision = None  # db.historical_revision() the index was built at
+        self._reset()
+
+    def _reset(self):
+        self.postings = {}    # word -> set of row ids
+        self.vocabulary = []  # every indexed word, sorted at the end of each refresh
+        self.vocabulary_sorted = True
+        self.docs = {}        # row id -> (ts, row id, source); sorts newest first
+        self.echoes = 0       # bot posts of slash command submissions, left out of the index
+        self.last_id = 0
+
+    def _add_row(self, row_id, ts, source, item_name, catalog_number):
+        self.docs[row_id] = (ts, row_id, source)
+        for word in set(tokenize(item_name) + tokenize(catalog_number)):
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = set()
+                self.vocabulary.append(word)
+                self.vocabulary_sorted = False
+            posting.add(row_id)
+        self.last_id = max(self.last_id, row_id)
+
+    def _catch_up(self):
+        echoes = self.db.echo_ids(after_id=self.last_id)
+        for row in self.db.rows_after(self.last_id, "id, ts, source, item_name, catalog_number"):
+            if row["id"] in echoes:
+                self.echoes += 1
+                self.last_id = max(self.last_id, row["id"])
+                continue
+            self._add_row(row["id"], row["ts"], row["source"], row["item_name"], row["catalog_number"])
+
+    def refresh(self):
+        """Index rows saved since the last refresh; rebuild if indexed rows were changed or removed."""
+        with self._lock:
+            # The extractor upserts rows in place (same id, new item name), so any
+            # historical import since the last refresh means a rebuild
+            revision = self.db.historical_revision()
+            if revision != self.revision:
+                if self.docs or self.echoes:
+                    self._reset()
+                    self.rebuilds += 1
+                self.revision = revision
+                self._catch_up()
+            # Other than that, rows are only removed when a month is re-imported, which
+            # also adds rows, so the count is only compared when there are new ones
+            elif self.db.max_id() > self.last_id:
+                self._catch_up()
+                if self.db.stats()[0] != len(self.docs) + self.echoes:
+                    self._reset()
+                    self.rebuilds += 1
+                    self._catch_up()
+            if not self.vocabulary_sorted:
+                self.vocabulary.sort()
+                self.vocabulary_sorted = True
+            return len(self.docs)
+
+    def _matches(self, word):
+        """Row ids with a word starting with word."""
+        start = bisect_left(self.vocabulary, word)
+        end = bisect_left(self.vocabulary, word + "\uffff", start)
+        if end - start == 1:
+            return self.postings[self.vocabulary[start]]
+        matched = set()
+        for indexed_word in self.vocabulary[start:end]:
+            matched |= self.postings[indexed_word]
+        return matched
+
+    def search(self, query, page=1, per_page=DEFAULT_PAGE_SIZE, source=None):
+        """Search requests; return a dict with the page of results and the total match count."""
+        started = time.perf_counter()
+        self.refresh()
+        page = max(page, 1)
+        per_page = min(max(per_page, 1), MAX_PAGE_SIZE)
+        words = tokenize(query)
+
+        with self._lock:
+            matched = None
+            # Intersect the smallest candidate sets first
+            for candidates in sorted((self._matches(word) for word in words), key=len):
+                matched = set(candidates) if matched is None else matched & candidates
+                if not matched:
+                    break
+            matched = matched or set()
+            if source:
+                matched = {row_id for row_id in matched if self.docs[row_id][2] == source}
+            # Only the requests up to this page need ranking
+            wanted = page * per_page
+            if wanted < len(matched) // 4:
+                ranked = heapq.nlargest(wanted, matched, key=self.docs.__getitem__)
+            else:
+                ranked = sorted(matched, key=self.docs.__getitem__, reverse=True)
+
+        page_ids = ranked[(page - 1) * per_page:wanted]
+        return {
+            "query": query,
+            "total": len(matched),
+            "page": page,
+            "per_page": per_page,
+            "results": [format_result(row) for row in self.db.rows_by_id(page_ids)],
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+
+def format_result(row):
+    """Public fields of a request row."""
+    record = json.loads(row["record"])
+    return {
+        "id": row["id"],
+        "source": row["source"],
+        "month": row["month"],
+        "saved_at": datetime.fromtimestamp(row["ts"]).isoformat(timespec="seconds"),
+        "requester": row["user_name"] or row["user_id"] or record.get("requester_name"),
+        "user_id": row["user_id"],
+        "item_name": record.get("item_name", ""),
+        "quantity": record.get("quantity", ""),
+        "catalog_number": record.get("catalog_number", ""),
+        "link": record.get("link", ""),
+        "date_of_request": record.get("date_of_request", ""),
+    }
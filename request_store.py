@@ -0,0 +1,128 @@
+"""
+Monthly purchase request files.
+
+Requests are stored in the SQLite database (request_db.py), which writes
+the monthly JSON and CSV exports through write_views below. Before it,
+each submission was appended to a monthly journal
+(purchase_requests_YYYY-MM.jsonl), and older months only have a
+purchase_requests_YYYY-MM.json file; load_month reads either so that
+`python request_db.py import` can bring them into the database.
+
+Export writers coordinate through an advisory lock on
+purchase_requests_YYYY-MM.lock that works across threads and processes,
+and views are replaced by a temp-file rename, so a crash never leaves a
+truncated JSON or CSV. Readers take no lock: they see either the old or
+the new view.
+"""
+
+import os
+import json
+import csv
+import glob
+import fcntl
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+FILE_PREFIX = "purchase_requests"
+CSV_FIELDS = ["item_name", "quantity", "catalog_number", "link", "date_of_request"]
+
+
+def current_month():
+    """Return the current month key (YYYY-MM)."""
+    return datetime.now().strftime("%Y-%m")
+
+
+def month_paths(folder, month):
+    """Return the journal, JSON view and CSV view paths for a month."""
+    base = os.path.join(folder, f"{FILE_PREFIX}_{month}")
+    return base + ".jsonl", base + ".json", base + ".csv"
+
+
+@contextmanager
+def month_lock(folder, month, shared=False):
+    """Hold a month's writer lock; flock() excludes threads as well as processes."""
+    lock_file = os.path.join(folder, f"{FILE_PREFIX}_{month}.lock")
+    # Each open() gets its own open file description, which is what flock() locks
+    with open(lock_file, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def read_journal(journal_file):
+    """Read all records from a journal, skipping a torn trailing line."""
+    records = []
+    with open(journal_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A crash mid-append can leave a partial last line
+                continue
+    return records
+
+
+def load_month(folder, month):
+    """Load a month's requests from its journal, or the legacy JSON file."""
+    journal_file, json_file, _ = month_paths(folder, month)
+    if os.path.exists(journal_file):
+        return read_journal(journal_file)
+    if os.path.exists(json_file):
+        with open(json_file, 'r') as f:
+            return json.load(f)
+    return []
+
+
+@contextmanager
+def atomic_write(path, newline=None, mode='w'):
+    """Open a temp file next to path and rename it over path once written."""
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_file, mode, newline=newline) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def _write_views_unlocked(folder, month, records):
+    """Atomically replace the JSON and CSV views; caller holds the month lock."""
+    _, json_file, csv_file = month_paths(folder, month)
+
+    # Save to JSON file (for loading)
+    with atomic_write(json_file) as f:
+        json.dump(records, f, indent=2)
+
+    # Also save to CSV file (for easy viewing)
+    with atomic_write(csv_file, newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        for req in records:
+            if all(key in req for key in CSV_FIELDS):
+                writer.writerow([req[key] for key in CSV_FIELDS])
+
+
+def write_views(folder, month, records):
+    """Write the JSON and CSV views of a month from a full list of requests."""
+    with month_lock(folder, month):
+        _write_views_unlocked(folder, month, records)
+
+
+def list_months(folder):
+    """Return all month keys that have a journal or a JSON file in folder."""
+    months = set()
+    for pattern in (f"{FILE_PREFIX}_*.jsonl", f"{FILE_PREFIX}_*.json"):
+        for path in glob.glob(os.path.join(folder, pattern)):
+            name = os.path.basename(path)
+            months.add(name[len(FILE_PREFIX) + 1:].split(".")[0])
+    return sorted(months)
+
@@ -0,0 +1,90 @@
+"""
+Timestamp index of /purchase_request slash commands.
+
+Bot-format requests don't say who asked for them, so the extractor
+attributes each one to the slash command that triggered it. Instead of
+re-parsing up to 50 preceding messages per bot message, every slash
+command is parsed and normalized once, and each lookup is a bisect on the
+message timestamps followed by a token comparison against the few
+commands inside the matching window.
+
+SlashCommandIndex.find() returns the same user as the linear
+find_original_requester() in extract_historical_requests.py, including its
+message-count limits: at most 49 messages back within 60 seconds for an
+item match, then the first slash command within 30 seconds among the 10
+messages before and 2 after.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+
+MATCH_WINDOW_SECONDS = 60
+MATCH_MAX_MESSAGES_BACK = 49
+FALLBACK_WINDOW_SECONDS = 30
+FALLBACK_MESSAGES_BACK = 10
+FALLBACK_MESSAGES_AHEAD = 2
+
+_NON_ALNUM = re.compile(r'[^a-zA-Z0-9\s]')
+
+
+def normalize_item(item_name):
+    """Lowercase an item name and strip everything but letters, digits and spaces."""
+    return _NON_ALNUM.sub('', (item_name or '').lower().strip())
+
+
+def items_match(clean_a, tokens_a, clean_b, tokens_b):
+    """Exact or substring match of normalized names, or at least two shared words."""
+    return bool(clean_a and clean_b and (
+        clean_a == clean_b or
+        clean_a in clean_b or
+        clean_b in clean_a or
+        len(tokens_a & tokens_b) >= 2))
+
+
+class SlashCommandIndex:
+    """Slash commands of a chronologically sorted message list, keyed by timestamp."""
+
+    def __init__(self, messages_sorted, parse_slash_command):
+        self.message_count = len(messages_sorted)
+        self.timestamps = []  # ts of each slash command, ascending
+        self.positions = []   # index of each slash command in messages_sorted
+        self.entries = []     # (user_id, normalized item or None, item tokens)
+
+        for position, message in enumerate(messages_sorted):
+            text = message.get("text", "")
+            if "/purchase_request" not in text.lower():
+                continue
+            slash_data = parse_slash_command(text)
+            clean_item = normalize_item(slash_data.get('item_name', '')) if slash_data else None
+            self.timestamps.append(float(message.get("ts", "0")))
+            self.positions.append(position)
+            self.entries.append((message.get("user", ""), clean_item, set((clean_item or '').split())))
+
+    def find(self, messages_sorted, current_index, request_data):
+        """Return the user ID of the slash command behind a request, or None."""
+        current_ts = float(messages_sorted[current_index].get("ts", "0"))
+
+        # Item match: nearest first, within the time window and message limit
+        if request_data:
+            bot_item = normalize_item(request_data.get('item_name', ''))
+            bot_tokens = set(bot_item.split())
+            lo = max(bisect_left(self.timestamps, current_ts - MATCH_WINDOW_SECONDS),
+                     bisect_left(self.positions, max(1, current_index - MATCH_MAX_MESSAGES_BACK)))
+            hi = bisect_left(self.positions, current_index)
+            for k in range(hi - 1, lo - 1, -1):
+                user_id, clean_item, tokens = self.entries[k]
+                if clean_item is not None and user_id and \
+                        items_match(clean_item, tokens, bot_item, bot_tokens):
+                    return user_id
+
+        # Fallback: any slash command close in time, oldest first
+        lo = max(bisect_left(self.timestamps, current_ts - FALLBACK_WINDOW_SECONDS),
+                 bisect_left(self.positions, max(0, current_index - FALLBACK_MESSAGES_BACK)))
+        hi = min(bisect_right(self.timestamps, current_ts + FALLBACK_WINDOW_SECONDS),
+                 bisect_right(self.positions, current_index + FALLBACK_MESSAGES_AHEAD))
+        for k in range(lo, hi):
+            user_id = self.entries[k][0]
+            if self.positions[k] != current_index and user_id:
+                return user_id
+
+        return None
@@ -0,0 +1,198 @@
+"""
+Shared Slack Web API client.
+
+One requests.Session per token with a keep-alive connection pool, so the
+slackbot, the historical extractor and the user-name linker reuse TCP/TLS
+connections instead of opening one per call. Every request has a timeout,
+so a slow Slack API can no longer hang a Flask worker.
+
+Pool sizes and timeouts can be tuned with environment variables:
+SLACK_POOL_CONNECTIONS, SLACK_POOL_MAXSIZE, SLACK_CONNECT_TIMEOUT and
+SLACK_READ_TIMEOUT (seconds).
+
+Calls are paced by a token bucket per API method, at the rate of the
+method's Slack rate-limit tier (Slack counts each method separately), so
+bulk jobs such as history backfills run at the highest rate Slack allows. HTTP 429
+responses are retried after the Retry-After delay, and every second spent
+waiting is counted in throttle_stats().
+
+Callers with a deadline (a slash command must be answered within 3 seconds)
+pass max_wait: if the bucket waits and Retry-After delays of a call would
+add up to more than that many seconds, the call raises
+RateLimitWaitExceeded instead of sleeping.
+"""
+
+import os
+import time
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+SLACK_API_BASE = "https://slack.com/api/"
+
+POOL_CONNECTIONS = int(os.getenv("SLACK_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.getenv("SLACK_POOL_MAXSIZE", "16"))
+CONNECT_TIMEOUT = float(os.getenv("SLACK_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("SLACK_READ_TIMEOUT", "15"))
+MAX_RATE_LIMIT_RETRIES = 5
+
+# Requests per minute for each Slack rate-limit tier; "post" covers
+# chat.postMessage, which Slack limits to about one message per second
+TIER_RATES = {1: 1, 2: 20, 3: 50, 4: 100, "post": 60}
+METHOD_TIERS = {
+    "conversations.history": 3,
+    "conversations.replies": 3,
+    "conversations.list": 2,
+    "users.info": 4,
+    "users.list": 2,
+    "chat.postMessage": "post",
+}
+DEFAULT_TIER = 3
+
+
+class RateLimitWaitExceeded(Exception):
+    """Rate limiting would make the call wait longer than the caller's max_wait."""
+
+    def __init__(self, method, wait_seconds):
+        super().__init__(f"{method} is rate limited for another {wait_seconds:.1f}s")
+        self.method = method
+        self.wait_seconds = wait_seconds
+
+
+class SlackAPIError(RuntimeError):
+    """A Slack API call answered with ok: false."""
+
+    def __init__(self, message, error):
+        super().__init__(message)
+        self.error = error
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at rate_per_minute, holding up to burst tokens."""
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1, rate_per_minute // 10)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait=None):
+        """Take one token, sleeping until one is available; return seconds waited.
+
+        With max_wait, returns None without taking a token (and without
+        sleeping) if one would not be available within max_wait seconds.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+                if max_wait is not None and waited + delay > max_wait:
+                    return None
+            time.sleep(delay)
+            waited += delay
+
+    def wait_time(self):
+        """Seconds until the next token is available."""
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            return max(self.blocked_until - now, (1 - tokens) / self.rate, 0.0)
+
+    def block_for(self, seconds):
+        """Hold back every caller of this bucket for seconds (after a 429)."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class SlackClient:
+    """Pooled, keep-alive client for Slack Web API methods."""
+
+    def __init__(self, token, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), max_retry_after=None):
+        self.timeout = timeout
+        # Longest Retry-After worth waiting for; longer 429s are returned to the caller
+        self.max_retry_after = max_retry_after
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"bucket_wait_seconds": 0.0, "retry_after_wait_seconds": 0.0, "rate_limited_responses": 0}
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {token}"})
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, method, max_wait=None, **params):
+        """Call a read method such as users.info with query parameters."""
+        return self._call(method, "GET", max_wait=max_wait, params=params)
+
+    def post(self, method, payload, max_wait=None):
+        """Call a write method such as chat.postMessage with a JSON body."""
+        return self._call(method, "POST", max_wait=max_wait, json=payload)
+
+    def _call(self, method, http_method, max_wait=None, **kwargs):
+        """Send one API call paced by its method's bucket, retrying on HTTP 429.
+
+        Raises RateLimitWaitExceeded if the bucket waits and Retry-After
+        delays together would make the call wait longer than max_wait seconds.
+        """
+        bucket = self._bucket(method)
+        total_waited = 0.0
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            waited = bucket.acquire(None if max_wait is None else max_wait - total_waited)
+            if waited is None:
+                raise RateLimitWaitExceeded(method, bucket.wait_time())
+            total_waited += waited
+            self._add_stat("bucket_wait_seconds", waited)
+            response = self.session.request(http_method, SLACK_API_BASE + method, timeout=self.timeout, **kwargs)
+            if response.status_code != 429:
+                return response
+
+            self._add_stat("rate_limited_responses", 1)
+            retry_after = float(response.headers.get("Retry-After", "1"))
+            if attempt == MAX_RATE_LIMIT_RETRIES or (
+                    self.max_retry_after is not None and retry_after > self.max_retry_after):
+                return response
+            bucket.block_for(retry_after)
+            if max_wait is not None and total_waited + retry_after > max_wait:
+                raise RateLimitWaitExceeded(method, retry_after)
+            time.sleep(retry_after)
+            total_waited += retry_after
+            self._add_stat("retry_after_wait_seconds", retry_after)
+        return response
+
+    def _bucket(self, method):
+        with self._buckets_lock:
+            if method not in self._buckets:
+                self._buckets[method] = TokenBucket(TIER_RATES[METHOD_TIERS.get(method, DEFAULT_TIER)])
+            return self._buckets[method]
+
+    def _add_stat(self, name, value):
+        if value:
+            with self._stats_lock:
+                self._stats[name] += value
+
+    def throttle_stats(self):
+        """Return time spent waiting on the token buckets and on Retry-After."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["total_throttled_seconds"] = stats["bucket_wait_seconds"] + stats["retry_after_wait_seconds"]
+        return stats
+
+    def post_url(self, url, payload):
+        """POST a JSON body to a non-API Slack URL, such as a slash command's response_url."""
+        # response_url is authenticated by the URL itself, not the bot token
+        return self.session.post(url, json=payload, headers={"Authorization": None}, timeout=self.timeout)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,110 @@
+"""
+Background dispatcher for Slack posts.
+
+A bounded in-process queue drained by worker threads, so the slash-command
+handler can return its ephemeral ack without waiting on the Slack API.
+Each job is retried with exponential backoff; a job that still fails is
+passed to an on_failure callback (used for response_url follow-ups).
+"""
+
+import time
+import queue
+import logging
+import threading
+from collections import deque
+
+log = logging.getLogger("slack_dispatcher")
+
+
+class SlackDispatcher:
+    """Run jobs on worker threads fed by a bounded queue."""
+
+    def __init__(self, handler, on_failure=None, workers=2, max_queue_size=100,
+                 max_attempts=3, backoff_seconds=1.0):
+        self.handler = handler
+        self.on_failure = on_failure
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._latencies = deque(maxlen=500)
+        self._in_flight = 0
+        self._counts = {"submitted": 0, "succeeded": 0, "failed": 0, "retried": 0, "rejected": 0}
+
+    def start(self):
+        """Start the worker threads (once per process)."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"slack-dispatch-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, job):
+        """Queue a job; return False without blocking if the queue is full."""
+        # Started lazily so forked server workers each get their own threads
+        self.start()
+        try:
+            self._queue.put_nowait((time.monotonic(), job))
+        except queue.Full:
+            with self._lock:
+                self._counts["rejected"] += 1
+            return False
+        with self._lock:
+            self._counts["submitted"] += 1
+        return True
+
+    def _worker(self):
+        while True:
+            enqueued_at, job = self._queue.get()
+            with self._lock:
+                self._in_flight += 1
+            try:
+                succeeded = self._run(job)
+                if not succeeded and self.on_failure:
+                    self.on_failure(job)
+            except Exception:
+                succeeded = False
+                log.exception("Error in Slack dispatcher")
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._counts["succeeded" if succeeded else "failed"] += 1
+                    self._latencies.append(time.monotonic() - enqueued_at)
+                self._queue.task_done()
+
+    def _run(self, job):
+        """Run a job, retrying with exponential backoff; return True on success."""
+        for attempt in range(self.max_attempts):
+            try:
+                if self.handler(job):
+                    return True
+            except Exception as e:
+                log.warning("Slack dispatch attempt raised", extra={"attempt": attempt + 1, "error": str(e)})
+            if attempt + 1 < self.max_attempts:
+                with self._lock:
+                    self._counts["retried"] += 1
+                time.sleep(self.backoff_seconds * (2 ** attempt))
+        return False
+
+    def stats(self):
+        """Return queue depth, job counts and enqueue-to-done latency (seconds)."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "in_flight": self._in_flight,
+                "workers": len(self._threads),
+                **self._counts,
+            }
+        if latencies:
+            stats["latency_seconds"] = {
+                "p50": round(latencies[len(latencies) // 2], 4),
+                "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4),
+                "max": round(latencies[-1], 4),
+            }
+        return stats
@@ -0,0 +1,240 @@
+"""
+Structured, leveled logging for the slackbot and the extraction scripts.
+
+Diagnostics go through the standard logging module, one logger per category
+("slackbot.commands", "extractor.requests", ...), configured once by
+configure():
+
+    LOG_LEVEL=DEBUG                       # DEBUG, INFO (default), WARNING, ERROR
+    LOG_FORMAT=json                       # one JSON object per line instead of text
+    LOG_SAMPLE="extractor.requests=0.01,slackbot.commands=0.1"
+
+Sampling keeps the given fraction of a category's records below WARNING
+(a category also covers its children, and the longest match wins); warnings
+and errors are never dropped. Kept records carry their sample_rate so counts
+can be scaled back up.
+
+Extra fields passed as logging's extra={...} become keys of the JSON object
+(or key=value pairs in text output).
+
+ProgressReporter rolls per-item work up into a periodic line with the rate,
+ETA and counts by kind, instead of a line per item.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+
+DEFAULT_LEVEL = "INFO"
+DEFAULT_FORMAT = "text"
+PROGRESS_INTERVAL_SECONDS = 10.0
+
+# Attributes every LogRecord has; anything else on a record came from extra={...}
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_configured = None
+
+
+def record_fields(record):
+    """The extra={...} fields of a record."""
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRIBUTES}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, category, message and the extra fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "category": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable line with the scalar extra fields appended as key=value.
+
+    Nested fields (such as a progress summary, which the message already
+    spells out) only appear in JSON output.
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s", "%Y-%m-%d %H:%M:%S")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = {key: value for key, value in record_fields(record).items() if not isinstance(value, (dict, list))}
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+def parse_sample_rates(text):
+    """{category: rate} from "category=rate,category=rate"; malformed entries are ignored."""
+    rates = {}
+    for entry in (text or "").split(","):
+        category, _, rate = entry.partition("=")
+        try:
+            rates[category.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fixed fraction of each sampled category's records below WARNING.
+
+    Records are thinned evenly (every 1/rate-th one is kept) rather than at
+    random, so a category's output stays proportional over any stretch.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self.dropped = {}
+        self._credit = {}
+        self._rate_cache = {}
+        self._lock = threading.Lock()
+
+    def rate_for(self, category):
+        rate = self._rate_cache.get(category)
+        if rate is None:
+            rate = 1.0
+            parts = category.split(".")
+            for end in range(len(parts), 0, -1):
+                prefix = ".".join(parts[:end])
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+            self._rate_cache[category] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0:
+            return True
+        with self._lock:
+            credit = self._credit.get(record.name, 1.0 - rate) + rate
+            keep = credit >= 1.0
+            self._credit[record.name] = credit - 1.0 if keep else credit
+            if not keep:
+                self.dropped[record.name] = self.dropped.get(record.name, 0) + 1
+        if keep:
+            record.sample_rate = rate
+        return keep
+
+
+def configure(level=None, fmt=None, sample=None, stream=None):
+    """Install the handler on the root logger (once); arguments override the LOG_* variables.
+
+    Returns the SamplingFilter, whose dropped counts show what sampling left out.
+    """
+    global _configured
+    level = (level or os.getenv("LOG_LEVEL") or DEFAULT_LEVEL).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT") or DEFAULT_FORMAT).lower()
+    rates = parse_sample_rates(sample if sample is not None else os.getenv("LOG_SAMPLE", ""))
+
+    root = logging.getLogger()
+    if _configured is not None:
+        handler, sampler = _configured
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    sampler = SamplingFilter(rates)
+    handler.addFilter(sampler)
+    root.addHandler(handler)
+    root.setLevel(level)
+    _configured = (handler, sampler)
+    return sampler
+
+
+def format_duration(seconds):
+    """Short duration text: 45s, 12m05s, 3h20m."""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+class ProgressReporter:
+    """Periodic progress line for a long loop: done/total, rate, ETA and counts by kind.
+
+        progress = ProgressReporter(log, "Parsed", total=len(messages), unit="messages")
+        for message in messages:
+            progress.advance()
+            if found:
+                progress.count(request["format_type"])
+        progress.finish()
+
+    advance() only compares a clock reading with the next report time, so it
+    can be called for every item.
+    """
+
+    def __init__(self, logger, label, total=None, unit="items", interval=PROGRESS_INTERVAL_SECONDS,
+                 clock=time.monotonic):
+        self.logger = logger
+        self.label = label
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.clock = clock
+        self.done = 0
+        self.counts = {}
+        self.started = clock()
+        self._next_report = self.started + interval
+
+    def advance(self, amount=1):
+        self.done += amount
+        if self.clock() >= self._next_report:
+            self.report()
+
+    def count(self, kind, amount=1):
+        self.counts[kind] = self.counts.get(kind, 0) + amount
+
+    def summary(self):
+        """Progress fields: done, total, rate per second, ETA in seconds and counts by kind."""
+        elapsed = max(self.clock() - self.started, 1e-9)
+        rate = self.done / elapsed
+        fields = {"done": self.done, "total": self.total, "rate": round(rate, 1),
+                  "elapsed_seconds": round(elapsed, 1), "counts": dict(self.counts)}
+        if self.total and rate > 0:
+            fields["eta_seconds"] = round(max(self.total - self.done, 0) / rate, 1)
+        return fields
+
+    def _message(self, fields, final):
+        done = f"{fields['done']:,}" + (f"/{self.total:,}" if self.total else "")
+        parts = [f"{self.label} {done} {self.unit}"]
+        if self.total and not final:
+            parts[0] += f" ({fields['done'] / self.total:.0%})"
+        parts.append(f"{fields['rate']:,.0f} {self.unit}/s")
+        if final:
+            parts.append(f"in {format_duration(fields['elapsed_seconds'])}")
+        elif "eta_seconds" in fields:
+            parts.append(f"ETA {format_duration(fields['eta_seconds'])}")
+        if self.counts:
+            parts.append(", ".join(f"{kind} {count:,}" for kind, count in
+                                   sorted(self.counts.items(), key=lambda item: -item[1])))
+        return " · ".join(parts)
+
+    def report(self, final=False):
+        fields = self.summary()
+        self.logger.info(self._message(fields, final), extra={"progress": fields})
+        self._next_report = self.clock() + self.interval
+        return fields
+
+    def finish(self):
+        """Log the final totals and return them."""
+        return self.report(final=True)
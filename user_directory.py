@@ -0,0 +1,198 @@
+"""
+Shared Slack user directory cache.
+
+Maps user IDs to display names for the slackbot and the historical
+extractor, so each user is looked up with users.info at most once per TTL
+instead of once per message. Entries are evicted least-recently-used past
+max_entries, and can be persisted to user_directory_cache.json next to
+user_id_mapping.json so later runs start warm.
+
+sync() bulk-loads the whole workspace by paging through users.list, which
+costs a handful of requests instead of one users.info call per user;
+start_periodic_sync() repeats it on a background thread.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from request_store import atomic_write
+from slack_client import SlackAPIError
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_NEGATIVE_TTL_SECONDS = 5 * 60
+DEFAULT_MAX_ENTRIES = 5000
+USERS_LIST_PAGE_SIZE = 200
+CACHE_FILE_NAME = "user_directory_cache.json"
+
+log = logging.getLogger("user_directory")
+
+
+def display_name_from_user(user_info):
+    """Pick display_name, then real_name, then username from a Slack user object."""
+    profile = user_info.get("profile", {})
+    return profile.get("display_name") or profile.get("real_name") or user_info.get("name")
+
+
+def fetch_display_name(client, user_id, max_wait=None):
+    """Look up one user with users.info through a SlackClient.
+
+    Returns None if Slack has no such user; raises on HTTP or other API
+    errors (and when users.info is rate limited for longer than max_wait)
+    so that transient failures are not cached.
+    """
+    response = client.get("users.info", max_wait=max_wait, user=user_id)
+    response.raise_for_status()
+
+    resp_json = response.json()
+    if resp_json.get("ok"):
+        return display_name_from_user(resp_json.get("user", {}))
+    if resp_json.get("error") == "user_not_found":
+        return None
+    error = resp_json.get('error', 'Unknown error')
+    raise SlackAPIError(f"Slack API error for user {user_id}: {error}", error)
+
+
+def list_display_names(client, page_size=USERS_LIST_PAGE_SIZE):
+    """Page through users.list and yield (user_id, display_name) for every member."""
+    cursor = None
+
+    while True:
+        params = {"limit": page_size}
+        if cursor:
+            params["cursor"] = cursor
+
+        response = client.get("users.list", **params)
+        response.raise_for_status()
+        data = response.json()
+        if not data.get("ok"):
+            error = data.get('error', 'Unknown error')
+            raise SlackAPIError(f"Slack API error from users.list: {error}", error)
+
+        for member in data.get("members", []):
+            yield member.get("id"), display_name_from_user(member)
+
+        cursor = data.get("response_metadata", {}).get("next_cursor")
+        if not cursor:
+            break
+
+
+class UserDirectory:
+    """Thread-safe TTL + LRU cache of user ID -> display name."""
+
+    def __init__(self, fetch, list_all=None, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 negative_ttl_seconds=DEFAULT_NEGATIVE_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES,
+                 persist_path=None, autosave=False):
+        self.fetch = fetch
+        self.list_all = list_all
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self.autosave = autosave
+        self._entries = OrderedDict()  # user_id -> (display_name or None, fetched_at)
+        self._lock = threading.Lock()
+        self._sync_thread = None
+        self.last_sync = None
+        self.hits = 0
+        self.misses = 0
+        if persist_path:
+            self.load()
+
+    def get(self, user_id):
+        """Return (found, display_name) from the cache without calling Slack."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return False, None
+            name, fetched_at = entry
+            ttl = self.ttl_seconds if name is not None else self.negative_ttl_seconds
+            if time.time() - fetched_at > ttl:
+                del self._entries[user_id]
+                return False, None
+            self._entries.move_to_end(user_id)
+            return True, name
+
+    def put(self, user_id, display_name, fetched_at=None):
+        """Store a display name (None records a user Slack does not know)."""
+        with self._lock:
+            self._entries[user_id] = (display_name, fetched_at or time.time())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resolve(self, user_id):
+        """Return the display name for user_id, calling fetch only on a cache miss."""
+        found, name = self.get(user_id)
+        if found:
+            self.hits += 1
+            return name
+        self.misses += 1
+        name = self.fetch(user_id)
+        self.put(user_id, name)
+        if self.autosave and name is not None:
+            self.save()
+        return name
+
+    def sync(self):
+        """Bulk-load every workspace member through list_all; return the count."""
+        count = 0
+        fetched_at = time.time()
+        for user_id, name in self.list_all():
+            if user_id and name:
+                self.put(user_id, name, fetched_at)
+                count += 1
+        self.last_sync = fetched_at
+        if self.persist_path:
+            self.save()
+        return count
+
+    def start_periodic_sync(self, interval_seconds):
+        """Run sync() now and then every interval_seconds on a daemon thread."""
+        with self._lock:
+            if self._sync_thread is not None:
+                return
+            self._sync_thread = threading.Thread(
+                target=self._sync_loop, args=(interval_seconds,), name="user-directory-sync", daemon=True)
+        self._sync_thread.start()
+
+    def _sync_loop(self, interval_seconds):
+        while True:
+            try:
+                count = self.sync()
+                log.info("User directory synced", extra={"users": count})
+            except Exception as e:
+                log.warning("User directory sync failed", extra={"error": str(e)})
+            time.sleep(interval_seconds)
+
+    def load(self):
+        """Load unexpired names from the persisted cache file, if any."""
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable user cache", extra={"path": self.persist_path, "error": str(e)})
+            return
+        now = time.time()
+        # Oldest first, so the LRU order roughly follows fetch time
+        for user_id, (name, fetched_at) in sorted(data.items(), key=lambda item: item[1][1]):
+            if name is not None and now - fetched_at <= self.ttl_seconds:
+                self.put(user_id, name, fetched_at)
+
+    def save(self):
+        """Persist known names (not negative entries) to the cache file."""
+        if not self.persist_path:
+            return
+        with self._lock:
+            data = {user_id: [name, fetched_at]
+                    for user_id, (name, fetched_at) in self._entries.items() if name is not None}
+        with atomic_write(self.persist_path) as f:
+            json.dump(data, f, indent=2)
+
+    def __len__(self):
+        return len(self._entries)